@@ -360,31 +360,37 @@ class NumatoDevice(RelayBase):
     def _activate_relay(self, relay_index):
         # a relay mutex is held before calling this function
         self.set(NumatoNode.relay, relay_index )
-        self._relay_status[ relay_index] = 1
 
     def _deactivate_relay(self, relay_index):
         # a relay mutex is held before calling this function
         self.clear(NumatoNode.relay, relay_index)
-        self._relay_status[ relay_index ] = 0
 
-    """
-    def write_all_relays(self, activated_relays):
-        self.writeall( channel_node = NumatoNode.relay,
-                       on_channels = activated_relays )
+    def _write_all_relays_bulk(self, on_mask, changed_mask):
+        # a relay mutex is held before calling this function
+        # writeall sets every relay at once, so changed_mask is not needed
+        on_channels = self._create_channel_num_list_from_mask(on_mask, self.num_relays)
+        self.writeall(channel_node = NumatoNode.relay, on_channels = on_channels)
+
+    def _read_all_relays_hw(self):
+        # a relay mutex is held before calling this function
+        response = self._execute_serial_cmd(NumatoNode.relay.name + " readall")
 
-        # keep _relay_status up to date
-        for i in range(0, self.num_relays):
-            if i in activated_relays:
-                self._relay_status[i] = 1
-            else:
-                self._relay_status[i] = 0
+        try:
+            on_mask = int(response, 16)
+        except (TypeError, ValueError):
+            raise Exception("unexpected response to relay readall: " + repr(response)) from None
 
-    """
-    def read_all_relays(self):
+        # ignore any bits past the relays this board has
+        return on_mask & ((1 << self.num_relays) - 1)
+
+    def read_all_relays(self, force = True):
         """
-        Convenience function
+        Convenience function. unlike the base class this queries the board by
+        default, so relays changed outside this process are picked up. the
+        query also brings the cached relay state back in line with the
+        hardware. pass force=False for the cached state
         """
-        return self.readall( channel_node = NumatoNode.relay )
+        return super().read_all_relays(force = force)
 
     def set_iodir(self, channel_node, input_channels):
 
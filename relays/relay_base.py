@@ -1,11 +1,18 @@
-import os
 from abc import ABC, abstractmethod
+import functools
+import heapq
+import itertools
 import threading
+import time
 import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
 from enum import IntEnum, auto
 
 LOGGER = logging.getLogger(__name__)
-LOGGER.setLevel(logging.DEBUG)
+
+# most target masks cached per board by _validate_group_consistency
+_GROUP_LOOKUP_MAX = 256
 
 class RelayGroupType(IntEnum):
     # only one can be active in the group
@@ -27,9 +34,9 @@ class SeqGuard:
     called before the specified delay_ms duration. Note: the delay starts
     from the time the block of code is exited.
 
-    - Holds a single shared BoundedSemaphore(1)
-    - __enter__: acquire immediately
-    - __exit__: release via Timer after delay_ms (or immediately if 0)
+    - Holds a single shared Lock
+    - __enter__: acquire, then sleep until delay_ms has passed since the last exit
+    - __exit__: record the earliest time the next block may run, then release
 
     example:
 
@@ -46,21 +53,79 @@ class SeqGuard:
         print("second guarded block")
 
     """
+    __slots__ = ("_gate", "_delay_s", "_next_ok")
+
     def __init__(self, delay_ms: int = 0):
-        self._gate = threading.BoundedSemaphore(1)
-        self._delay_ms = int(delay_ms) if delay_ms else 0
+        self._gate = threading.Lock()
+        # kept in seconds, the unit time.monotonic() works in
+        self._delay_s = int(delay_ms) / 1000.0 if delay_ms else 0.0
+        # time.monotonic() before which the next block must not start
+        self._next_ok = 0.0
 
     def __enter__(self):
         self._gate.acquire()
+        if self._delay_s:
+            remaining = self._next_ok - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
         return self
 
     def __exit__(self, exc_type, exc, tb):
-        if self._delay_ms > 0:
-            t = threading.Timer(self._delay_ms / 1000.0, self._gate.release)
-            t.daemon = True
-            t.start()
-        else:
-            self._gate.release()
+        if self._delay_s:
+            self._next_ok = time.monotonic() + self._delay_s
+        self._gate.release()
+
+
+class _NullGuard:
+    """
+    stands in for SeqGuard and the state lock on boards created with
+    thread_safe=False and no seq_delay_ms: entering and exiting do nothing
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+@dataclass(frozen=True, slots=True)
+class _GroupInfo:
+    """
+    a typed relay group, resolved once from the relay_groups config
+    """
+    name: str
+    type: RelayGroupType
+    members: int    # bit N set means relay N is in the group
+    size: int
+
+
+def _indices_from_mask(mask: int) -> list[int]:
+    """
+    unpack a relay bitmask into a sorted list of relay indices. only walks up
+    to the highest set bit
+    """
+    indices = []
+    index = 0
+    while mask:
+        if mask & 1:
+            indices.append(index)
+        mask >>= 1
+        index += 1
+    return indices
+
+
+def _synchronized(method):
+    """
+    run the decorated RelayBase method while holding the instance state lock,
+    so planning a change and writing it to the board happen atomically
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._state_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class RelayBase(ABC):
@@ -69,98 +134,213 @@ class RelayBase(ABC):
     Handles activation, deactivation, and toggling of relays while enforcing
     group constraints defined in `relay_groups`.
     """
-
-    def __init__(self, num_relays, supports_autosense: bool = False, relay_groups: dict = {}, seq_delay_ms: int = 0):
-        self._relay_groups = relay_groups
+    __slots__ = ("_state_lock", "_relay_groups", "_relay_to_group", "_group_members",
+                 "_group_type_of", "_group_meta", "_grouped_mask", "_groups",
+                 "_group_lookup", "num_relays", "_lock", "_on_mask",
+                 "_on_list_cache", "_batch_depth", "_batch_pending",
+                 "_auto_off_cond", "_auto_off_heap", "_auto_off_seq", "_auto_off_thread",
+                 "_thread_safe")
+
+    def __init__(self, num_relays, supports_autosense: bool = False, relay_groups: dict | None = None, seq_delay_ms: int = 0,
+                 thread_safe: bool = True):
+        # guards relay state across a whole public call. reentrant because
+        # public methods (and subclass overrides of them) call one another.
+        # thread_safe=False is for boards only ever driven from one thread.
+        # non-blocking auto_off_ms runs on its own thread, so it is rejected
+        self._thread_safe = thread_safe
+        self._state_lock = threading.RLock() if thread_safe else _NullGuard()
+
+        # None (the default) means no groups
+        self._relay_groups = relay_groups or {}
         self._relay_to_group = {}
         self._group_members = {}
+        # group name -> RelayGroupType, flattened once so lookups are a single dict.get.
+        # the handler tables are indexed by type, so anything that isn't a
+        # RelayGroupType is rejected here rather than failing on first use
+        self._group_type_of = {}
+        for group_name, meta in self._relay_groups.get("groups", {}).items():
+            group_type = meta.get("type")
+            if group_type is not None:
+                try:
+                    group_type = RelayGroupType(group_type)
+                except (ValueError, TypeError):
+                    raise ValueError(f"relay group '{group_name}' has unknown type {group_type!r}") from None
+            self._group_type_of[group_name] = group_type
 
         for relay_index, meta in self._relay_groups.get("relays", {}).items():
             group_name = meta.get("group_name")
             if group_name:
                 self._relay_to_group[relay_index] = group_name
-                self._group_members.setdefault(group_name, set()).add(relay_index)
+                # members are kept as a bitmask: bit N set means relay N is in the group
+                self._group_members[group_name] = self._group_members.get(group_name, 0) | (1 << relay_index)
+
+        # group name -> the (group_name, group_type, members) tuple handed back
+        # by _resolve_group, built once so lookups return it by reference
+        self._group_meta = {name: (name, self._group_type(name), members)
+                            for name, members in self._group_members.items()}
+
+        # every relay that belongs to some group
+        self._grouped_mask = 0
+        for members in self._group_members.values():
+            self._grouped_mask |= members
+
+        # every typed group. write_all_relays walks this on every call so
+        # resolve it once here
+        self._groups = tuple(_GroupInfo(name, self._group_type(name), members, members.bit_count())
+                             for name, members in self._group_members.items()
+                             if self._group_type(name))
+
+        # group membership is fixed after this point, so the group resolved
+        # for a given set of targets never changes. cached per instance, keyed
+        # on the targets mask. a plain dict rather than lru_cache around the
+        # bound method, which would keep the board alive through a reference
+        # cycle
+        self._group_lookup = {}
 
         self.num_relays = num_relays
-        self._lock = SeqGuard(seq_delay_ms)
-        self._relay_status = {}
+        # with a single caller and no pacing delay there is nothing to guard
+        self._lock = SeqGuard(seq_delay_ms) if thread_safe or seq_delay_ms else _NullGuard()
+        # bit N set means relay N is active. owned by this class: subclass
+        # _activate_relay/_deactivate_relay only need to talk to the hardware
+        self._on_mask = 0
+        # (mask, active relay indices) as of the last read_all_relays
+        self._on_list_cache = (0, ())
+
+        # pending desired mask while inside a batch() block, None otherwise
+        self._batch_depth = 0
+        self._batch_pending = None
+
+        # pending auto-offs as (deadline, seq, relays), served by
+        # one worker thread that is started on demand and exits once the heap
+        # is empty
+        self._auto_off_cond = threading.Condition()
+        self._auto_off_heap = []
+        self._auto_off_seq = itertools.count()
+        self._auto_off_thread = None
 
         self._flush_buffers()
-        self.write_all_relays([])
-
-        for i in range(num_relays):
-            self._relay_status[i] = 0
-
-    def _group_of(self, relay_index: int):
-        return self._relay_to_group.get(relay_index)
+        self._reset_hardware()
 
     def _group_type(self, group_name: str):
-        return self._relay_groups.get("groups", {}).get(group_name, {}).get("type")
-
-    def _members(self, group_name: str) -> set[int]:
-        return set(self._group_members.get(group_name, set()))
+        return self._group_type_of.get(group_name)
 
-    def _current_on(self) -> set[int]:
-        return {i for i, v in self._relay_status.items() if v}
+    def _current_mask(self) -> int:
+        if self._batch_pending is not None:
+            return self._batch_pending
+        return self._on_mask
 
-    def _validate_parameters(self, relay_index: int | None, relay_list: list[int] | None) -> list[int]:
+    @contextmanager
+    def batch(self):
+        """
+        Buffer relay changes and write them to hardware once, on exit of the
+        outermost batch block. Group rules are still validated on every call
+        so errors are raised immediately. read_all_relays and is_relay_active
+        inside the block report the buffered state. If the block raises, the buffered
+        changes are discarded and the hardware is left untouched. Other
+        threads are held off until the block exits.
+
+        example:
+
+        with board.batch():
+            board.activate_relay(0)
+            board.activate_relay(1)
+            board.deactivate_relay(2)
+        # relays 0, 1 and 2 are updated here in a single write
+        """
+        with self._state_lock:
+            if self._batch_depth == 0:
+                self._batch_pending = self._on_mask
+            self._batch_depth += 1
+
+            committed = False
+            try:
+                yield self
+                committed = True
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    pending = self._batch_pending
+                    self._batch_pending = None
+                    if committed:
+                        self._apply_delta(pending)
+
+    def _validate_parameters(self, relay_index: int | None, relay_list: list[int] | None) -> tuple[list[int], int]:
         if relay_index is not None and relay_list:
             raise ValueError("provide either relay_index or relay_list, not both")
-        if relay_list is not None:
-            if not relay_list:
-                raise ValueError("relay_list is empty")
-            targets = list(relay_list)
-        else:
+        if relay_list is None:
             if relay_index is None:
                 raise ValueError("must provide relay_index or relay_list")
-            targets = [relay_index]
+            # single relay: nothing to de-duplicate
+            if not (0 <= relay_index < self.num_relays):
+                raise IndexError(f"relay indices out of range (0..{self.num_relays - 1})")
+            return [relay_index], 1 << relay_index
+        if not relay_list:
+            raise ValueError("relay_list is empty")
+
+        # bounds check and de-duplicate in a single pass, keeping caller order.
+        # the packed mask is handed back so callers can test state with it
+        targets = []
+        targets_mask = 0
+        for t in relay_list:
+            if t < 0:
+                raise IndexError(f"relay indices out of range (0..{self.num_relays - 1})")
+            bit = 1 << t
+            if not targets_mask & bit:
+                targets_mask |= bit
+                targets.append(t)
 
-        max_idx = max(targets)
-        min_idx = min(targets)
-        if max_idx >= self.num_relays or min_idx < 0:
+        if targets_mask >> self.num_relays:
             raise IndexError(f"relay indices out of range (0..{self.num_relays - 1})")
 
-        return targets
-
-    def _detect_group_conflicts(self, targets: list[int]) -> str | None:
-        group_names = {self._group_of(t) for t in targets}
-        if len(group_names) > 1:
-            raise ValueError("all relays must belong to the same group or all be ungrouped")
-        return next(iter(group_names))
-
-    def _get_group_metadata(self, group_name: str | None):
-        if group_name is None:
-            return None, None, set()
-        group_type = self._group_type(group_name)
-        members = self._members(group_name)
-        return group_name, group_type, members
+        return targets, targets_mask
 
-    def _validate_group_consistency(self, targets: list[int]):
-        group_name = self._detect_group_conflicts(targets)
-        return self._get_group_metadata(group_name)
+    def _resolve_group(self, targets_mask: int):
+        """
+        return (group_name, group_type, members) shared by every target, or
+        (None, None, 0) if the targets are ungrouped. groups never overlap, so
+        the group of any one target decides it for all of them
+        """
+        grouped = targets_mask & self._grouped_mask
+        if not grouped:
+            return None, None, 0
 
-    def _apply_delta(self, desired_on: set[int]) -> None:
-        desired_on = {i for i in desired_on if 0 <= i < self.num_relays}
-        current_on = self._current_on()
+        lowest = grouped & -grouped
+        meta = self._group_meta[self._relay_to_group[lowest.bit_length() - 1]]
 
-        adds = desired_on - current_on
-        removes = current_on - desired_on
-        changes = len(adds) + len(removes)
+        # some targets ungrouped, or some in another group
+        if grouped != targets_mask or targets_mask & ~meta[2]:
+            raise ValueError("all relays must belong to the same group or all be ungrouped")
 
-        if changes == 0:
-            logger.debug("Relay: no changes")
+        return meta
+
+    def _validate_group_consistency(self, targets_mask: int):
+        # no grouped relay among the targets: nothing to look up
+        if not targets_mask & self._grouped_mask:
+            return None, None, 0
+        # keyed on the packed mask: hashing an int is cheaper than building a
+        # frozenset, and the same relays in any order share one cache entry
+        meta = self._group_lookup.get(targets_mask)
+        if meta is None:
+            meta = self._resolve_group(targets_mask)
+            if len(self._group_lookup) < _GROUP_LOOKUP_MAX:
+                self._group_lookup[targets_mask] = meta
+        return meta
+
+    def _apply_delta(self, desired_mask: int) -> None:
+        """
+        move the board to desired_mask. the mask must already be in range and
+        satisfy every group rule; no further validation is done here
+        """
+        if self._batch_pending is not None:
+            self._batch_pending = desired_mask
             return
 
-        if changes == 1:
-            idx = next(iter(adds or removes))
-            with self._lock:
-                if idx in adds:
-                    self._activate_relay(idx)
-                else:
-                    self._deactivate_relay(idx)
+        changed_mask = desired_mask ^ self._on_mask
+        if not changed_mask:
+            LOGGER.debug("Relay: no changes")
             return
 
-        self._write_all_relays_raw(sorted(desired_on))
+        self._write_all_relays_raw(desired_mask, changed_mask)
 
     @abstractmethod
     def _activate_relay(self, relay_index: int) -> None:
@@ -182,6 +362,16 @@ class RelayBase(ABC):
         """
         pass
 
+    def _reset_hardware(self) -> None:
+        """
+        Optional: drive every relay off at startup. the board state is unknown
+        until we've written it, so every channel is written regardless of
+        _on_mask. nothing is on, so there is no group logic to run.
+        Default: one _write_all_relays_bulk if supported, else a per-relay
+        _deactivate_relay for every channel
+        """
+        self._write_all_relays_raw(0, changed_mask=(1 << self.num_relays) - 1)
+
     def autosense_hardware(self) -> None:
         """
         Optional: query board to determine num_relays
@@ -196,225 +386,457 @@ class RelayBase(ABC):
         """
         raise NotImplementedError("read_relay_hw not implemented for this device")
 
+    def _read_all_relays_hw(self) -> int | None:
+        """
+        Optional: read the state of every relay in a single query. Return an
+        int where bit N set means relay N is active, or None (the default) to
+        fall back to read_relay for each relay.
+        a relay mutex is held before calling this function
+        """
+        return None
+
     def _schedule_auto_off(self, delay_ms: int, relays: list[int]) -> None:
         """
-        Schedule a one-shot timer to deactivate the given relays after delay_ms.
+        Schedule the given relays to be deactivated after delay_ms.
         """
+        deadline = time.monotonic() + delay_ms / 1000.0
         relays = list(relays)
 
-        def cb():
-            with self._lock:
+        with self._auto_off_cond:
+            heapq.heappush(self._auto_off_heap, (deadline, next(self._auto_off_seq), relays))
+            if self._auto_off_thread is None:
+                self._auto_off_thread = threading.Thread(target=self._auto_off_worker, daemon=True)
+                self._auto_off_thread.start()
+            else:
+                # the new entry may be due before the one being waited on
+                self._auto_off_cond.notify()
+
+    def _auto_off_worker(self) -> None:
+        heap = self._auto_off_heap
+
+        while True:
+            with self._auto_off_cond:
+                while True:
+                    if not heap:
+                        self._auto_off_thread = None
+                        return
+                    remaining = heap[0][0] - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._auto_off_cond.wait(remaining)
+
+                now = time.monotonic()
+                due = []
+                while heap and heap[0][0] <= now:
+                    due.append(heapq.heappop(heap))
+
+            # the condition is released first: deactivate_relay takes the state
+            # lock, and a caller holding that may be scheduling an auto-off.
+            # relays already switched off by hand are a no-op there. the state
+            # is only checked under the lock: inside a batch() the relays may
+            # be on in the pending state but not yet on the board
+            for _, _, relays in due:
                 try:
                     self.deactivate_relay(relay_list=relays)
                 except Exception:
                     pass
 
-        t = threading.Timer(delay_ms / 1000.0, cb)
-        t.daemon = True
-        t.start()
+    ############################################################################
+    # group policies. each handler is a pure function of relay bitmasks for one
+    # group type: it returns the new desired mask, or raises ValueError if the
+    # request breaks the group rule. activate/deactivate/toggle handlers share
+    # the signature (group_name, current, targets_mask, members)
+    ############################################################################
+
+    @staticmethod
+    def _activate_exclusive(group_name, current, targets_mask, members):
+        if targets_mask & (targets_mask - 1):
+            raise ValueError(f"exclusive group '{group_name}' allows activating exactly one member")
+        return (current & ~members) | targets_mask
+
+    @staticmethod
+    def _activate_force_matching(group_name, current, targets_mask, members):
+        return current | members
+
+    @staticmethod
+    def _activate_check_matching(group_name, current, targets_mask, members):
+        if targets_mask != members:
+            raise ValueError(f"check_matching group '{group_name}' requires all members: {_indices_from_mask(members)}")
+        return current | members
+
+    @staticmethod
+    def _activate_synced(group_name, current, targets_mask, members):
+        if targets_mask != members:
+            raise ValueError(f"synced group '{group_name}' requires all members be updated together")
+        return current | members
+
+    @staticmethod
+    def _deactivate_exclusive(group_name, current, targets_mask, members):
+        return current & ~targets_mask
+
+    @staticmethod
+    def _deactivate_force_matching(group_name, current, targets_mask, members):
+        return current & ~members
+
+    @staticmethod
+    def _deactivate_check_matching(group_name, current, targets_mask, members):
+        if targets_mask != members:
+            raise ValueError(f"check_matching group '{group_name}' requires all members: {_indices_from_mask(members)}")
+        return current & ~members
+
+    @staticmethod
+    def _deactivate_synced(group_name, current, targets_mask, members):
+        if targets_mask != members:
+            raise ValueError(f"synced group '{group_name}' requires all members be updated together")
+        return current & ~members
+
+    @staticmethod
+    def _toggle_exclusive(group_name, current, targets_mask, members):
+        if current & targets_mask:
+            return current & ~targets_mask
+        return (current & ~members) | targets_mask
+
+    @staticmethod
+    def _toggle_force_matching(group_name, current, targets_mask, members):
+        if current & members:
+            return current & ~members
+        return current | members
+
+    @staticmethod
+    def _toggle_check_matching(group_name, current, targets_mask, members):
+        raise ValueError(f"check_matching group '{group_name}' forbids single-member toggle")
+
+    @staticmethod
+    def _toggle_synced(group_name, current, targets_mask, members):
+        raise ValueError(f"synced group '{group_name}' must be toggled as a full group via relay_list")
+
+    @staticmethod
+    def _write_all_exclusive(group_name, members, size, des, adds, removes, fixed):
+        # at most one member may be requested. whichever it is, the others
+        # in the group are already off in the requested state
+        if des & (des - 1):
+            raise ValueError(f"exclusive group '{group_name}' allows at most one ON, requested {_indices_from_mask(des)}")
+        return fixed
+
+    @staticmethod
+    def _write_all_force_matching(group_name, members, size, des, adds, removes, fixed):
+        if adds and not removes:
+            return fixed | members
+        if removes and not adds:
+            return fixed & ~members
+        if adds and removes:
+            raise ValueError(f"force_matching group '{group_name}' has mixed intent")
+        if 0 < des.bit_count() < size:
+            raise ValueError(f"force_matching group '{group_name}' cannot be partial")
+        return fixed
+
+    @staticmethod
+    def _write_all_check_matching(group_name, members, size, des, adds, removes, fixed):
+        if 0 < des.bit_count() < size:
+            raise ValueError(f"check_matching group '{group_name}' must be all-on or all-off")
+        if adds and not removes:
+            return fixed | members
+        if removes and not adds:
+            return fixed & ~members
+        if adds and removes:
+            raise ValueError(f"check_matching group '{group_name}' has mixed intent")
+        return fixed
+
+    @staticmethod
+    def _write_all_synced(group_name, members, size, des, adds, removes, fixed):
+        # write all by definition changes all of the relays in the group.
+        # it is not possible to determine further intent here
+        return fixed
+
+    # handler tables are indexed directly by RelayGroupType value, which
+    # starts at 1, so slot 0 is unused
+
+    # (activate, deactivate, toggle) handler per group type
+    _GROUP_DISPATCH = (
+        None,
+        (_activate_exclusive, _deactivate_exclusive, _toggle_exclusive),                   # EXCLUSIVE
+        (_activate_force_matching, _deactivate_force_matching, _toggle_force_matching),    # FORCE_MATCHING
+        (_activate_check_matching, _deactivate_check_matching, _toggle_check_matching),    # CHECK_MATCHING
+        (_activate_synced, _deactivate_synced, _toggle_synced),                            # SYNCED
+    )
+
+    _WRITE_ALL_HANDLERS = (
+        None,
+        _write_all_exclusive,           # EXCLUSIVE
+        _write_all_force_matching,      # FORCE_MATCHING
+        _write_all_check_matching,      # CHECK_MATCHING
+        _write_all_synced,              # SYNCED
+    )
 
     def activate_relay(self, relay_index: int = None, relay_list: list[int] = None, auto_off_ms: int | None = None, blocking = False) -> None:
-        targets = self._validate_parameters(relay_index, relay_list)
-
-        if all(self._relay_status.get(t, 0) == 1 for t in targets):
-            LOGGER.debug(f"activate_relay: targets {targets} already active, skipping")
-            return
+        targets = self._activate(relay_index, relay_list, auto_off_ms, blocking)
 
-        group_name, group_type, members = self._validate_group_consistency(targets)
-        current_on = self._current_on()
-        desired_on = set(current_on)
+        # the state lock is released by now, so a blocking pulse doesn't hold
+        # other threads off while it sleeps
+        if targets and auto_off_ms and auto_off_ms > 0:
+            self._auto_off(targets, auto_off_ms, blocking)
 
-        if group_name is None:
-            desired_on |= set(targets)
-            self._apply_delta(desired_on)
-            return
+    @_synchronized
+    def _activate(self, relay_index: int | None, relay_list: list[int] | None, auto_off_ms: int | None, blocking: bool) -> list[int] | None:
+        """
+        apply an activate_relay request. returns the targets, or None if they
+        were all active already
+        """
+        if not self._grouped_mask:
+            return self._activate_relay_ungrouped(relay_index, relay_list, auto_off_ms, blocking)
 
-        if group_type == RelayGroupType.EXCLUSIVE:
-            if len(targets) != 1:
-                raise ValueError(f"exclusive group '{group_name}' allows activating exactly one member")
-            chosen = targets[0]
-            desired_on -= members
-            desired_on.add(chosen)
+        targets, targets_mask = self._validate_parameters(relay_index, relay_list)
+        self._validate_auto_off(auto_off_ms, blocking)
+        current = self._current_mask()
 
-        elif group_type == RelayGroupType.FORCE_MATCHING:
-            desired_on |= members
+        if current & targets_mask == targets_mask:
+            LOGGER.debug("activate_relay: targets %s already active, skipping", targets)
+            return None
 
-        elif group_type == RelayGroupType.CHECK_MATCHING:
-            if set(targets) != members:
-                raise ValueError(f"check_matching group '{group_name}' requires all members: {sorted(members)}")
-            desired_on |= members
+        group_name, group_type, members = self._validate_group_consistency(targets_mask)
 
-        elif group_type == RelayGroupType.SYNCED:
-            if set(targets) != members:
-                raise ValueError(f"synced group '{group_name}' requires all members be updated together")
-            desired_on |= set(targets)
+        # ungrouped relays (or groups without a type) have no policy to apply
+        if group_type is None:
+            desired = current | targets_mask
+        else:
+            activate, _, _ = self._GROUP_DISPATCH[group_type]
+            desired = activate(group_name, current, targets_mask, members)
 
-        self._apply_delta(desired_on)
+        self._apply_delta(desired)
+        return targets
 
-        if auto_off_ms and auto_off_ms > 0:
-            if blocking:
-                time.sleep(auto_off_ms)
-                self.deactivate_relay(relay_list=relays)
-            else:
-                self._schedule_auto_off(auto_off_ms, targets)
+    def _validate_auto_off(self, auto_off_ms: int | None, blocking: bool) -> None:
+        # inside batch() nothing reaches the board until the block exits, so a
+        # blocking pulse would sleep with the batch's lock held and never be
+        # written
+        if blocking and auto_off_ms and auto_off_ms > 0 and self._batch_depth:
+            raise ValueError("blocking auto_off_ms can't be used inside batch()")
+        # a non-blocking auto_off switches the relays off from the worker
+        # thread, which would race the caller with no lock to stop it
+        if not blocking and auto_off_ms and auto_off_ms > 0 and not self._thread_safe:
+            raise ValueError("non-blocking auto_off_ms needs a board created with thread_safe=True")
+
+    def _auto_off(self, targets: list[int], auto_off_ms: int, blocking: bool) -> None:
+        if blocking:
+            time.sleep(auto_off_ms / 1000.0)
+            self.deactivate_relay(relay_list=targets)
+        else:
+            self._schedule_auto_off(auto_off_ms, targets)
 
+    @_synchronized
     def deactivate_relay(self, relay_index: int = None, relay_list: list[int] = None) -> None:
-        targets = self._validate_parameters(relay_index, relay_list)
+        if not self._grouped_mask:
+            return self._deactivate_relay_ungrouped(relay_index, relay_list)
+
+        targets, targets_mask = self._validate_parameters(relay_index, relay_list)
+        current = self._current_mask()
 
         # If all targets are already OFF, skip entirely
-        if all(self._relay_status.get(t, 0) == 0 for t in targets):
-            LOGGER.debug(f"deactivate_relay: targets {targets} already inactive, skipping")
+        if not current & targets_mask:
+            LOGGER.debug("deactivate_relay: targets %s already inactive, skipping", targets)
             return
 
-        group_name, group_type, members = self._validate_group_consistency(targets)
-        current_on = self._current_on()
-        desired_on = set(current_on)
+        group_name, group_type, members = self._validate_group_consistency(targets_mask)
 
-        if group_name is None:
-            desired_on -= set(targets)
-            self._apply_delta(desired_on)
+        # ungrouped relays (or groups without a type) have no policy to apply
+        if group_type is None:
+            self._apply_delta(current & ~targets_mask)
             return
 
-        if group_type == RelayGroupType.EXCLUSIVE:
-            desired_on -= set(targets)
-
-        elif group_type == RelayGroupType.FORCE_MATCHING:
-            desired_on -= members
+        _, deactivate, _ = self._GROUP_DISPATCH[group_type]
+        desired = deactivate(group_name, current, targets_mask, members)
 
-        elif group_type == RelayGroupType.CHECK_MATCHING:
-            if set(targets) != members:
-                raise ValueError(f"check_matching group '{group_name}' requires all members: {sorted(members)}")
-            desired_on -= members
-
-        elif group_type == RelayGroupType.SYNCED:
-            if set(targets) != members:
-                raise ValueError(f"synced group '{group_name}' requires all members be updated together")
-            desired_on -= set(targets)
-
-        self._apply_delta(desired_on)
+        self._apply_delta(desired)
 
+    @_synchronized
     def toggle_relay(self, relay_index: int) -> None:
+        if not self._grouped_mask:
+            return self._toggle_relay_ungrouped(relay_index)
+
         if not (0 <= relay_index < self.num_relays):
             raise IndexError(f"relay_index {relay_index} out of range (0..{self.num_relays - 1})")
 
-        group_name = self._group_of(relay_index)
-        current_on = self._current_on()
-        desired_on = set(current_on)
+        bit = 1 << relay_index
+        group_name, group_type, members = self._validate_group_consistency(bit)
+        current = self._current_mask()
 
-        if group_name is None:
-            if relay_index in current_on:
-                desired_on.discard(relay_index)
-            else:
-                desired_on.add(relay_index)
-            self._apply_delta(desired_on)
+        # ungrouped relays (or groups without a type) have no policy to apply
+        if group_type is None:
+            self._apply_delta(current ^ bit)
             return
 
-        group_type = self._group_type(group_name)
-        members = self._members(group_name)
+        _, _, toggle = self._GROUP_DISPATCH[group_type]
+        desired = toggle(group_name, current, bit, members)
 
-        if group_type == RelayGroupType.EXCLUSIVE:
-            if relay_index in current_on:
-                desired_on.discard(relay_index)
-            else:
-                desired_on -= members
-                desired_on.add(relay_index)
+        self._apply_delta(desired)
 
-        elif group_type == RelayGroupType.FORCE_MATCHING:
-            any_on = any(m in current_on for m in members)
-            if any_on:
-                desired_on -= members
-            else:
-                desired_on |= members
+    ############################################################################
+    # activate/deactivate/toggle for boards with no groups at all. the public
+    # methods (_activate for activate_relay) hand off to these, skipping group
+    # resolution entirely. the state lock is already held
+    ############################################################################
 
-        elif group_type == RelayGroupType.CHECK_MATCHING:
-            raise ValueError(f"check_matching group '{group_name}' forbids single-member toggle")
+    def _activate_relay_ungrouped(self, relay_index: int | None, relay_list: list[int] | None, auto_off_ms: int | None, blocking: bool) -> list[int] | None:
+        targets, targets_mask = self._validate_parameters(relay_index, relay_list)
+        self._validate_auto_off(auto_off_ms, blocking)
+        current = self._current_mask()
 
-        elif group_type == RelayGroupType.SYNCED:
-            raise ValueError(f"synced group '{group_name}' must be toggled as a full group via relay_list")
+        if current & targets_mask == targets_mask:
+            LOGGER.debug("activate_relay: targets %s already active, skipping", targets)
+            return None
 
-        self._apply_delta(desired_on)
+        self._apply_delta(current | targets_mask)
+        return targets
+
+    def _deactivate_relay_ungrouped(self, relay_index: int = None, relay_list: list[int] = None) -> None:
+        targets, targets_mask = self._validate_parameters(relay_index, relay_list)
+        current = self._current_mask()
+
+        if not current & targets_mask:
+            LOGGER.debug("deactivate_relay: targets %s already inactive, skipping", targets)
+            return
+
+        self._apply_delta(current & ~targets_mask)
+
+    def _toggle_relay_ungrouped(self, relay_index: int) -> None:
+        if not (0 <= relay_index < self.num_relays):
+            raise IndexError(f"relay_index {relay_index} out of range (0..{self.num_relays - 1})")
+
+        self._apply_delta(self._current_mask() ^ (1 << relay_index))
+
+    def _write_all_relays_bulk(self, on_mask: int, changed_mask: int):
+        """
+        Optional: write the state of every relay in a single command. bit N of
+        on_mask set means relay N should be active. bit N of changed_mask set
+        means relay N must be written; boards that can address a subset of
+        relays in one frame may limit the command to those. Return
+        NotImplemented (the default) to fall back to per-relay
+        _activate_relay/_deactivate_relay.
+        a relay mutex is held before calling this function
+        """
+        return NotImplemented
+
+    def _write_all_relays_raw(self, on_mask: int, changed_mask: int | None = None) -> None:
+        # only command relays whose state differs from what we last wrote,
+        # unless the caller names the relays to write via changed_mask
+        if changed_mask is None:
+            changed_mask = on_mask ^ self._on_mask
+        if not changed_mask:
+            return
 
-    def _write_all_relays_raw(self, on_channels: list[int]) -> None:
-        on_set = set(on_channels)
         with self._lock:
-            for channel in range(self.num_relays):
-                if channel in on_set:
+            if not changed_mask & (changed_mask - 1):
+                # exactly one relay to write, the common case for single relay calls
+                channel = changed_mask.bit_length() - 1
+                if on_mask & changed_mask:
                     self._activate_relay(channel)
+                    self._on_mask |= changed_mask
                 else:
                     self._deactivate_relay(channel)
-
+                    self._on_mask &= ~changed_mask
+                return
+
+            # more than one relay to write
+            if self._write_all_relays_bulk(on_mask, changed_mask) is not NotImplemented:
+                self._on_mask = on_mask
+                return
+
+            activate = self._activate_relay
+            deactivate = self._deactivate_relay
+            state = self._on_mask
+            # walk only the changed bits instead of every channel, writing every
+            # relay that turns off before any that turns on (break before make)
+            # so switching an exclusive group never has two members on at once.
+            # state is written back even if a hardware call raises part way, so
+            # _on_mask still matches the relays that were actually commanded
+            offs = changed_mask & ~on_mask
+            ons = changed_mask & on_mask
+            try:
+                while offs:
+                    bit = offs & -offs
+                    offs ^= bit
+                    deactivate(bit.bit_length() - 1)
+                    state &= ~bit
+                while ons:
+                    bit = ons & -ons
+                    ons ^= bit
+                    activate(bit.bit_length() - 1)
+                    state |= bit
+            finally:
+                self._on_mask = state
+
+    @_synchronized
     def write_all_relays(self, on_channels: list[int]) -> None:
-        if on_channels:
-            if min(on_channels) < 0 or max(on_channels) >= self.num_relays:
+        # write_all_relays_mask rejects anything past the last relay
+        on_mask = 0
+        for channel in on_channels:
+            if channel < 0:
                 raise IndexError(f"relay indices out of range (0..{self.num_relays - 1})")
+            on_mask |= 1 << channel
 
-        desired_on = set(on_channels)
-        current_on = self._current_on()
-        fixed_on = set(desired_on)
+        self.write_all_relays_mask(on_mask)
 
-        for group_name, members in self._group_members.items():
-            group_type = self._group_type(group_name)
-            if not group_type:
-                continue
+    @_synchronized
+    def write_all_relays_mask(self, on_mask: int) -> None:
+        """
+        same as write_all_relays, but the relays to activate are given as a
+        bitmask: bit N set means relay N is active. all others are deactivated
+        """
+        if on_mask < 0 or on_mask >> self.num_relays:
+            raise IndexError(f"relay indices out of range (0..{self.num_relays - 1})")
 
-            cur_on = current_on & members
-            des_on = fixed_on & members
-            adds = des_on - cur_on
-            removes = cur_on - des_on
-            size = len(members)
-
-            if group_type == RelayGroupType.EXCLUSIVE:
-                if len(des_on) > 1:
-                    raise ValueError(f"exclusive group '{group_name}' allows at most one ON, requested {sorted(des_on)}")
-                if len(adds) == 1:
-                    only = next(iter(adds))
-                    fixed_on -= members
-                    fixed_on.add(only)
-                elif len(des_on) == 1 and len(adds) == 0:
-                    only = next(iter(des_on))
-                    fixed_on -= (members - {only})
-
-            elif group_type == RelayGroupType.FORCE_MATCHING:
-                if adds and not removes:
-                    fixed_on |= members
-                elif removes and not adds:
-                    fixed_on -= members
-                elif adds and removes:
-                    raise ValueError(f"force_matching group '{group_name}' has mixed intent")
-                else:
-                    count = len(des_on)
-                    if 0 < count < size:
-                        raise ValueError(f"force_matching group '{group_name}' cannot be partial")
-
-            elif group_type == RelayGroupType.CHECK_MATCHING:
-                count = len(des_on)
-                if 0 < count < size:
-                    raise ValueError(f"check_matching group '{group_name}' must be all-on or all-off")
-                if adds and not removes:
-                    fixed_on |= members
-                elif removes and not adds:
-                    fixed_on -= members
-                elif adds and removes:
-                    raise ValueError(f"check_matching group '{group_name}' has mixed intent")
-
-            elif group_type == RelayGroupType.SYNCED:
-                # write all by definition changes all of the relays in the group.
-                # it is not possible to determine further intent here
-                pass
-
-        self._write_all_relays_raw(sorted(fixed_on))
-
-    def read_all_relays(self, force : bool = False) -> list[int]:
+        current = self._current_mask()
 
-        if force:
-            for i in range(self.num_relays):
-                state = int(self.read_relay(i))
-                self._relay_status[i] = 1 if state else 0
+        # the current state already satisfies every group rule
+        if on_mask == current:
+            LOGGER.debug("write_all_relays: requested state already applied, skipping")
+            return
 
-        return [index for index, active in self._relay_status.items() if active]
+        fixed = on_mask
+        changed = on_mask ^ current
 
-    def is_relay_active(self, relay_index: int) -> bool:
-        if relay_index >= self.num_relays:
-            raise Exception(f"relay board only has {self.num_relays} relays")
-        return self._relay_status[relay_index] == 1
+        for group in self._groups:
+            members = group.members
+            # groups never overlap and the current state already satisfies
+            # every rule, so a group with no requested change needs no checks
+            if not changed & members:
+                continue
+            cur = current & members
+            des = fixed & members
+            adds = des & ~cur
+            removes = cur & ~des
 
+            fixed = self._WRITE_ALL_HANDLERS[group.type](group.name, members, group.size, des, adds, removes, fixed)
+
+        self._apply_delta(fixed)
+
+    @_synchronized
+    def read_all_relays(self, force : bool = False) -> tuple[int, ...]:
+        """
+        return the indices of the active relays, as a tuple. force re-reads
+        the state from the hardware first. inside batch() this is the pending
+        state, including changes not yet written. the same tuple is handed out
+        until the state changes
+        """
+        if force:
+            with self._lock:
+                on_mask = self._read_all_relays_hw()
+                if on_mask is None:
+                    on_mask = 0
+                    for i in range(self.num_relays):
+                        if int(self.read_relay(i)):
+                            on_mask |= 1 << i
+            self._on_mask = on_mask
+
+        # rebuilt only when the state has changed since the last read, so
+        # polling an unchanged board neither re-walks the mask nor allocates
+        on_mask = self._current_mask()
+        if self._on_list_cache[0] != on_mask:
+            self._on_list_cache = (on_mask, tuple(_indices_from_mask(on_mask)))
+        return self._on_list_cache[1]
+
+    @_synchronized
+    def is_relay_active(self, relay_index: int) -> bool:
+        if not (0 <= relay_index < self.num_relays):
+            raise IndexError(f"relay_index {relay_index} out of range (0..{self.num_relays - 1})")
+        return bool((self._current_mask() >> relay_index) & 1)
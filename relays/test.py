@@ -1,3 +1,8 @@
+import asyncio
+import io
+import os
+import re
+import threading
 import time
 import sys
 
@@ -6,6 +11,8 @@ from numato_relay_board import NumatoDevice
 from named_relay_utils import NamedRelay, NamedRelayGroup
 
 import logging
+from contextlib import contextmanager
+from logging.handlers import MemoryHandler
 
 
 logging.basicConfig(
@@ -13,7 +20,7 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
-from typing import Iterable
+log = logging.getLogger(__name__)
 
 # assume RelayBase and RelayGroupType are importable from your codebase
 # from yourmodule import RelayBase, RelayGroupType
@@ -27,60 +34,122 @@ class TestRelayBoard(RelayBase):
     adds detailed logging for write_all, activate, and deactivate.
     """
 
-    def __init__(self, num_relays=4, relay_groups: dict = {}, seq_delay_ms: int = 0):
+    def __init__(self, num_relays=4, relay_groups: dict = {}, seq_delay_ms: int = 0,
+                 thread_safe: bool = True):
+
+        # simulated hardware state. the base class resets the board during
+        # its __init__ so this must exist first. one byte per relay, indexed
+        # directly by relay index
+        self._relay_status = bytearray(num_relays)
 
         super().__init__(num_relays=num_relays,
                          supports_autosense=False,
                          relay_groups=relay_groups,
-                         seq_delay_ms = seq_delay_ms)
+                         seq_delay_ms = seq_delay_ms,
+                         thread_safe = thread_safe)
 
     def _activate_relay(self, relay_index: int) -> None:
-        prev = int(self._relay_status.get(relay_index, 0))
+        prev = self._relay_status[relay_index]
         self._relay_status[relay_index] = 1
-        logging.debug("activate relay %d: %d -> 1", relay_index, prev)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("activate relay %d: %d -> 1", relay_index, prev)
 
     def _deactivate_relay(self, relay_index: int) -> None:
-        prev = int(self._relay_status.get(relay_index, 0))
+        prev = self._relay_status[relay_index]
         self._relay_status[relay_index] = 0
-        logging.debug("deactivate relay %d: %d -> 0", relay_index, prev)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("deactivate relay %d: %d -> 0", relay_index, prev)
 
     def read_all_relays(self) -> list[int]:
         """
         return a list of relay states (0/1) for all relays.
         always returns exactly num_relays elements.
         """
-        return [self._relay_status.get(i, 0) for i in range(self.num_relays)]
+        return list(self._relay_status)
 
     def write_all_relays(self, on_channels: list[int]) -> None:
         """
         log the request, delegate to base class to enforce group logic,
         then log the post-write state vector.
         """
-        logging.debug("write_all_relays request on_channels=%s", sorted(on_channels))
+        debug = log.isEnabledFor(logging.DEBUG)
+        if debug:
+            log.debug("write_all_relays request on_channels=%s", sorted(on_channels))
         super().write_all_relays(on_channels)
-        logging.debug("write_all_relays applied, state=%s", self.read_all_relays())
+        if debug:
+            log.debug("write_all_relays applied, state=%s", self.read_all_relays())
+
+
+class _RecordingRelayBoard(TestRelayBoard):
+    """
+    TestRelayBoard that also records every hardware write as (relay, 0/1), in
+    the order they were made. the writes from the reset in __init__ are
+    dropped. for tests that check how a change reached the board, so these
+    always use the in-memory board
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.writes = []
+        super().__init__(*args, **kwargs)
+        self.writes.clear()
+
+    def _activate_relay(self, relay_index: int) -> None:
+        self.writes.append((relay_index, 1))
+        super()._activate_relay(relay_index)
+
+    def _deactivate_relay(self, relay_index: int) -> None:
+        self.writes.append((relay_index, 0))
+        super()._deactivate_relay(relay_index)
+
+class _HwReadRelayBoard(TestRelayBoard):
+    """
+    TestRelayBoard that can be read back, through the single-query
+    _read_all_relays_hw hook or, with use_hook=False, one read_relay per
+    relay. counts the hardware reads of each kind
+    """
 
+    def __init__(self, *args, use_hook: bool = True, **kwargs):
+        self.use_hook = use_hook
+        self.hw_reads = 0
+        self.relay_reads = 0
+        super().__init__(*args, **kwargs)
+
+    def _read_all_relays_hw(self) -> int | None:
+        if not self.use_hook:
+            return None
+        self.hw_reads += 1
+        return sum(v << i for i, v in enumerate(self._relay_status))
+
+    def read_relay(self, relay_index: int) -> int:
+        self.relay_reads += 1
+        return self._relay_status[relay_index]
 
 # ---------------- optional: run against your NumatoDevice ----------------
 
 USE_NUMATO = True
+
+# RELAY_FAIL_FAST=1 stops the run at the first failing test
+FAIL_FAST = os.environ.get("RELAY_FAIL_FAST", "0") == "1"
+
+# RELAY_VERBOSE=0 (or --quiet) skips the per-test header/config/result output;
+# the summary is always printed
+VERBOSE = os.environ.get("RELAY_VERBOSE", "1") == "1"
 NUMATO_PATH = "/dev/tty.usbmodem21101"
 
-if USE_NUMATO:
-    def make_board(relay_groups: dict, seq_delay_ms: int = 50):
+def make_board(relay_groups: dict, seq_delay_ms: int | None = None):
+    # looked up on each call so --fake can switch boards after import
+    if USE_NUMATO:
         return NumatoDevice(
             path=NUMATO_PATH,
             num_relays=4,
             num_gpio=4,
             num_adc=4,
             relay_groups=relay_groups,
-            seq_delay_ms = seq_delay_ms
+            seq_delay_ms = 50 if seq_delay_ms is None else seq_delay_ms
         )
-else:
-    def make_board(relay_groups: dict, seq_delay_ms: int = 0):
-        return TestRelayBoard( num_relays = 4,
-                               relay_groups=relay_groups,
-                               seq_delay_ms=seq_delay_ms)
+    return TestRelayBoard( num_relays = 4,
+                           relay_groups=relay_groups,
+                           seq_delay_ms = seq_delay_ms or 0)
 
 # ---------------- helpers ----------------
 
@@ -89,44 +158,57 @@ def announce(msg: str):
     logging.info("### %s", msg)
     logging.info("")
 
-def vectorize_state(board, raw) -> list[int]:
+def state_mask(raw, n: int) -> int:
     """
-    normalize different driver return shapes to a 0/1 vector of length num_relays.
-    if raw already looks like a 0/1 vector, return it.
+    normalize different driver return shapes to an int bitmask (bit i = relay i).
+    if raw looks like a 0/1 vector of length n, fold it into a mask.
     otherwise treat raw as list of active indices.
     """
-    if isinstance(raw, list) and len(raw) == board.num_relays and all(x in (0, 0.0, 1, 1.0) for x in raw):
-        return [int(x) for x in raw]
-    vec = [0] * board.num_relays
+    if isinstance(raw, list) and len(raw) == n and all(x in (0, 0.0, 1, 1.0) for x in raw):
+        return sum(int(v) << i for i, v in enumerate(raw))
+    mask = 0
     for i in raw:
-        if 0 <= i < board.num_relays:
-            vec[i] = 1
-    return vec
+        if 0 <= i < n:
+            mask |= 1 << i
+    return mask
+
+def mask_to_vec(mask: int, n: int) -> list[int]:
+    """expand a relay bitmask into a 0/1 vector of length n (for logging)."""
+    return [(mask >> i) & 1 for i in range(n)]
 
-def check(board, expected_on_indices: Iterable[int], step: str) -> bool:
+def check_mask(board, expected_mask: int, step: str) -> int:
     """
-    compare the expected ON indices against the device's actual state.
+    compare the expected ON bitmask (bit i = relay i) against the device's
+    actual state. the 0/1 vectors are only built when they are going to be logged.
     logs:
       INFO  expected relay state: [...] actual relay state: [...]
       DEBUG step: <desc> | expected: [...] | actual: [...] | OK/MISMATCH
-    returns True on match, False otherwise.
+    returns expected_mask ^ actual_mask, i.e. 0 on match and the mismatching
+    relays otherwise. tests OR these together and pass if the result is 0.
     """
-    expected_vec = [1 if i in set(expected_on_indices) else 0 for i in range(board.num_relays)]
-    actual_vec = vectorize_state(board, board.read_all_relays())
-    ok = (actual_vec == expected_vec)
-    logging.info("expected relay state: %s actual relay state: %s", expected_vec, actual_vec)
-    logging.debug(
-        "step: %s | expected: %s | actual: %s | %s",
-        step, expected_vec, actual_vec, "OK" if ok else "MISMATCH"
-    )
-    return ok
+    n = board.num_relays
+    actual_mask = state_mask(board.read_all_relays(), n)
+    diff = expected_mask ^ actual_mask
+    if logging.getLogger().isEnabledFor(logging.INFO):
+        expected_vec = mask_to_vec(expected_mask, n)
+        actual_vec = mask_to_vec(actual_mask, n)
+        logging.info("expected relay state: %s actual relay state: %s", expected_vec, actual_vec)
+        logging.debug(
+            "step: %s | expected: %s | actual: %s | %s",
+            step, expected_vec, actual_vec, "MISMATCH" if diff else "OK"
+        )
+    return diff
 
 def print_header(n: int, scenario: str):
+    if not VERBOSE:
+        return
     print("\n" + "#" * 31)
     print(f"# test {n}: {scenario}")
     print("#" * 31)
 
 def print_config(relay_groups: dict):
+    if not VERBOSE:
+        return
     print("relay configuration:")
     groups = relay_groups.get("groups", {})
     relays = relay_groups.get("relays", {})
@@ -141,593 +223,1046 @@ def print_config(relay_groups: dict):
     print()
 
 def print_result(ok: bool):
+    if not VERBOSE:
+        return
     print(f"result: {'pass' if ok else 'fail'}\n")
 
+class _ThreadStdout:
+    """
+    stand-in for sys.stdout while tests run concurrently. a thread that called
+    capture() writes into its own buffer; everything else goes to the real stream.
+    lets run() print each test's output in order once all of them are done.
+    """
 
-# ---------------- tests ----------------
-
-def run():
-    logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
 
-    tests = []
-    tnum = 1
+    def capture(self) -> None:
+        self._local.buf = io.StringIO()
 
-    # exclusive group of 2: sequential activate swaps member
-    def t1():
-        rg = {
-            "groups": {"A": {"type": RelayGroupType.EXCLUSIVE}},
-            "relays": {0: {"group_name": "A"}, 2: {"group_name": "A"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
+    def release(self) -> str:
+        buf = self._local.buf
+        self._local.buf = None
+        return buf.getvalue()
 
-        ok &= check(b, [], "initial state")
+    def write(self, text: str) -> int:
+        buf = getattr(self._local, "buf", None)
+        return (buf if buf is not None else self._stream).write(text)
 
-        announce("turning on group A by activating relay 0 (exclusive -> expect only 0 on)")
-        b.activate_relay(relay_index=0)
-        ok &= check(b, [0], "after activate 0")
+    def flush(self) -> None:
+        self._stream.flush()
 
-        announce("switching selection in group A by activating relay 2 (exclusive -> expect only 2 on)")
-        b.activate_relay(relay_index=2)
-        ok &= check(b, [2], "after activate 2")
-
-        announce("selecting relay 0 in group A via write_all_relays([0]) (exclusive -> expect only 0 on)")
-        b.write_all_relays([0])
-        ok &= check(b, [0], "after write_all {0}")
-
-        announce("clearing selection in group A via write_all_relays([]) (exclusive -> expect all off)")
-        b.write_all_relays([])
-        ok &= check(b, [], "after write_all {}")
-
-        announce("selecting relay 2 in group A via write_all_relays([2]) (exclusive -> expect only 2 on)")
-        b.write_all_relays([2])
-        ok &= check(b, [2], "after write_all {2}")
-
-        return ok
-    tests.append(("exclusive group of 2: updates via activate_* and write_all_relays", t1))
-
-    # exclusive negative: cannot activate two at once
-    def t2():
-        rg = {
-            "groups": {"A": {"type": RelayGroupType.EXCLUSIVE}},
-            "relays": {0: {"group_name": "A"}, 1: {"group_name": "A"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-        ok &= check(b, [], "initial state")
-        announce("attempting to activate [0,1] in exclusive group A (expect ValueError)")
-        try:
-            b.activate_relay(relay_list=[0, 1])
-            return False
-        except ValueError:
-            ok &= check(b, [], "after rejected multi-activate")
-            return ok
-    tests.append(("exclusive group of 2: activating [0,1] raises", t2))
-
-    # force_matching group of 2: single activate -> all on; single deactivate -> all off
-    def t3():
-        rg = {
-            "groups": {"B": {"type": RelayGroupType.FORCE_MATCHING}},
-            "relays": {0: {"group_name": "B"}, 1: {"group_name": "B"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-        ok &= check(b, [], "initial state")
-        announce("turning on all of group B by activating relay 0 (force_matching -> expect {0,1} on)")
-        b.activate_relay(relay_index=0)
-        ok &= check(b, [0, 1], "after activate 0")
-        announce("turning off all of group B by deactivating relay 1 (force_matching -> expect all off)")
-        b.deactivate_relay(relay_index=1)
-        ok &= check(b, [], "after deactivate 1")
-        return ok
-    tests.append(("force_matching group of 2: single op applies to entire group", t3))
-
-    # force_matching toggle: toggle one when off -> all on; toggle again -> all off
-    def t4():
-        rg = {
-            "groups": {"B": {"type": RelayGroupType.FORCE_MATCHING}},
-            "relays": {0: {"group_name": "B"}, 1: {"group_name": "B"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-        ok &= check(b, [], "initial state")
-        announce("turning on all of group B by toggling relay 0 (force_matching -> expect {0,1} on)")
-        b.toggle_relay(relay_index=0)
-        ok &= check(b, [0, 1], "after toggle 0")
-        announce("turning off all of group B by toggling relay 0 again (force_matching -> expect all off)")
-        b.toggle_relay(relay_index=0)
-        ok &= check(b, [], "after toggle 0 again")
-        return ok
-    tests.append(("force_matching group of 2: toggles obey group intent", t4))
-
-    # force_matching mixed intent via write_all: raise on adds+removes conflict
-    def t5():
-        rg = {
-            "groups": {"B": {"type": RelayGroupType.FORCE_MATCHING}},
-            "relays": {0: {"group_name": "B"}, 1: {"group_name": "B"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-
-        ok &= check(b, [], "initial state")
-
-        announce("creating illegal partial state {0} via raw write (bypasses group logic) to test mixed intent")
-        b._write_all_relays_raw([0])
-        ok &= check(b, [0], "after raw write {0}")
-
-        announce("requesting desired state {1} via write_all_relays (expect mixed add/remove -> ValueError)")
-        try:
-            b.write_all_relays([1])
-            return False
-        except ValueError:
-            ok &= check(b, [0], "after rejected mixed-intent write_all")
-            return ok
-    tests.append(("force_matching: write_all mixed add/remove raises", t5))
-
-    # check_matching group of 3: partial ops raise; full ops succeed
-    def t6():
-        rg = {
-            "groups": {"C": {"type": RelayGroupType.CHECK_MATCHING}},
-            "relays": {0: {"group_name": "C"}, 1: {"group_name": "C"}, 2: {"group_name": "C"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-        ok &= check(b, [], "initial state")
-
-        announce("attempting partial activate of group C by activating relay 0 (check_matching -> expect ValueError)")
-        try:
-            b.activate_relay(relay_index=0)
-            return False
-        except ValueError:
-            ok &= check(b, [], "after rejected partial activate")
+class _TestLogBuffer(logging.Handler):
+    """
+    root logger handler while run() is going. a thread that called capture()
+    keeps its records to itself until collect(), so a test's log lines can be
+    written out next to that test's result. everything else goes to
+    MemoryHandlers wrapping the original handlers, so DEBUG chatter is written
+    out in batches instead of one write per record. records at ERROR and above
+    flush immediately.
+    """
 
-        announce("activating the entire group C with [0,1,2] (check_matching -> expect all on)")
-        b.activate_relay(relay_list=[0, 1, 2])
-        ok &= check(b, [0, 1, 2], "after full activate")
+    def __init__(self, targets: list, capacity: int = 256):
+        super().__init__()
+        self._local = threading.local()
+        self._buffers = []
+        for h in targets:
+            mh = MemoryHandler(capacity, flushLevel=logging.ERROR, target=h)
+            mh.setLevel(h.level)
+            self._buffers.append(mh)
+
+    def capture(self) -> None:
+        self._local.records = []
+
+    def collect(self) -> list:
+        records = self._local.records
+        self._local.records = None
+        return records
+
+    def emit(self, record: logging.LogRecord) -> None:
+        records = getattr(self._local, "records", None)
+        if records is None:
+            self.replay([record])
+            return
+
+        # the args may change before the record is written out
+        record.msg = record.getMessage()
+        record.args = None
+        records.append(record)
+
+    def replay(self, records: list) -> None:
+        for record in records:
+            for mh in self._buffers:
+                if record.levelno >= mh.level:
+                    mh.handle(record)
+
+    def flush(self) -> None:
+        for mh in self._buffers:
+            mh.flush()
+
+    def close(self) -> None:
+        for mh in self._buffers:
+            mh.close()
+        super().close()
+
+@contextmanager
+def _buffered_logging(capacity: int = 256):
+    """
+    route the root logger's handlers through a _TestLogBuffer for the duration
+    and yield it.
+    """
+    root = logging.getLogger()
+    targets = root.handlers[:]
+    logs = _TestLogBuffer(targets, capacity)
+    for h in targets:
+        root.removeHandler(h)
+    root.addHandler(logs)
+
+    try:
+        yield logs
+    finally:
+        root.removeHandler(logs)
+        logs.close()
+        for h in targets:
+            root.addHandler(h)
+
+def _run_test(name: str, fn) -> bool:
+    try:
+        return fn()
+    except Exception:
+        logging.exception("unexpected error during %s", name)
+        return False
+
+async def _run_concurrently(tests: list, out: _ThreadStdout,
+                            logs: _TestLogBuffer) -> list[tuple[bool, str, list]]:
+    """
+    run every test on the default executor, returning (ok, printed output,
+    log records) in order.
+    """
+    loop = asyncio.get_running_loop()
 
-        announce("attempting partial deactivate of group C with [0,1] (check_matching -> expect ValueError)")
-        try:
-            b.deactivate_relay(relay_list=[0, 1])
-            return False
-        except ValueError:
-            ok &= check(b, [0, 1, 2], "after rejected partial deactivate")
-
-        announce("deactivating the entire group C with [0,1,2] (check_matching -> expect all off)")
-        b.deactivate_relay(relay_list=[0, 1, 2])
-        ok &= check(b, [], "after full deactivate")
-        return ok
-    tests.append(("check_matching group of 3: partial operations raise", t6))
-
-    # single-member force_matching: behaves like a normal relay
-    def t7():
-        rg = {
-            "groups": {"D": {"type": RelayGroupType.FORCE_MATCHING}},
-            "relays": {3: {"group_name": "D"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-        ok &= check(b, [], "initial state")
-        announce("turning on group D (size=1) by activating relay 3 (expect relay 3 on)")
-        b.activate_relay(relay_index=3)
-        ok &= check(b, [3], "after activate 3")
-        announce("turning off group D (size=1) by toggling relay 3 (expect relay 3 off)")
-        b.toggle_relay(relay_index=3)
-        ok &= check(b, [], "after toggle 3")
-        return ok
-    tests.append(("single-member force_matching: trivial group works", t7))
-
-    # mixed: force_matching {0,1} + ungrouped {2}
-    def t8():
-        rg = {
-            "groups": {"B": {"type": RelayGroupType.FORCE_MATCHING}},
-            "relays": {0: {"group_name": "B"}, 1: {"group_name": "B"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-        ok &= check(b, [], "initial state")
-        announce("turning on group B by write_all with {0,2} (expect group coerces to {0,1} and keep ungrouped 2)")
-        b.write_all_relays([0, 2])
-        ok &= check(b, [0, 1, 2], "after write_all {0,2}")
-        announce("turning off group B while keeping ungrouped 2 by write_all with {2}")
-        b.write_all_relays([2])
-        ok &= check(b, [2], "after write_all {2}")
-        return ok
-    tests.append(("mixed: force_matching group with ungrouped channel", t8))
-
-    # two groups: exclusive {0,1} + force_matching {2,3}
-    def t9():
-        rg = {
-            "groups": {
-                "A": {"type": RelayGroupType.EXCLUSIVE},
-                "B": {"type": RelayGroupType.FORCE_MATCHING},
-            },
-            "relays": {
-                0: {"group_name": "A"},
-                1: {"group_name": "A"},
-                2: {"group_name": "B"},
-                3: {"group_name": "B"},
-            },
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-        ok &= check(b, [], "initial state")
-
-        announce("selecting relay 0 in exclusive group A (expect only 0 on)")
-        b.activate_relay(relay_index=0)
-        ok &= check(b, [0], "after activate 0 in A")
-
-        announce("selecting relay 1 in exclusive group A and turning on group B by write_all {1,3}")
-        b.write_all_relays([1, 3])
-        ok &= check(b, [1, 2, 3], "after write_all {1,3}")
-
-        announce("turning off group B by toggling relay 2 (exclusive group A remains on relay 1)")
-        b.toggle_relay(relay_index=2)
-        ok &= check(b, [1], "after toggle 2 in B")
-        return ok
-    tests.append(("two groups: exclusive {0,1} + force_matching {2,3}", t9))
-
-    # check_matching group of 4: full operations only (toggle list removed)
-    def t10():
-        rg = {
-            "groups": {"E": {"type": RelayGroupType.CHECK_MATCHING}},
-            "relays": {0: {"group_name": "E"}, 1: {"group_name": "E"}, 2: {"group_name": "E"}, 3: {"group_name": "E"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-        ok &= check(b, [], "initial state")
-
-        announce("attempting single toggle of group E by toggling relay 0 (check_matching -> expect ValueError)")
+    def _captured(name, fn):
+        out.capture()
+        logs.capture()
         try:
-            b.toggle_relay(relay_index=0)
-            return False
-        except ValueError:
-            ok &= check(b, [], "after rejected single toggle")
+            ok = _run_test(name, fn)
+        finally:
+            text = out.release()
+            records = logs.collect()
+        return ok, text, records
+
+    async def _run(name, fn):
+        return await loop.run_in_executor(None, _captured, name, fn)
+
+    return await asyncio.gather(*(_run(name, fn) for name, fn in tests))
+
+
+# ---------------- relay group fixtures ----------------
+# shared by the tests below. the board never modifies the relay_groups dict
+# it is given, so one instance per configuration is enough.
+
+# exclusive group A {0,2}
+_RG_EXCLUSIVE_02 = {
+    "groups": {"A": {"type": RelayGroupType.EXCLUSIVE}},
+    "relays": {0: {"group_name": "A"}, 2: {"group_name": "A"}},
+}
+
+# exclusive group A {0,1}
+_RG_EXCLUSIVE_01 = {
+    "groups": {"A": {"type": RelayGroupType.EXCLUSIVE}},
+    "relays": {0: {"group_name": "A"}, 1: {"group_name": "A"}},
+}
+
+# force_matching group B {0,1}
+_RG_FORCE_MATCHING_01 = {
+    "groups": {"B": {"type": RelayGroupType.FORCE_MATCHING}},
+    "relays": {0: {"group_name": "B"}, 1: {"group_name": "B"}},
+}
+
+# check_matching group C {0,1,2}
+_RG_CHECK_MATCHING_012 = {
+    "groups": {"C": {"type": RelayGroupType.CHECK_MATCHING}},
+    "relays": {0: {"group_name": "C"}, 1: {"group_name": "C"}, 2: {"group_name": "C"}},
+}
+
+# single-member force_matching group D {3}
+_RG_FORCE_MATCHING_3 = {
+    "groups": {"D": {"type": RelayGroupType.FORCE_MATCHING}},
+    "relays": {3: {"group_name": "D"}},
+}
+
+# exclusive group A {0,1} + force_matching group B {2,3}
+_RG_EXCLUSIVE_01_FORCE_MATCHING_23 = {
+    "groups": {
+        "A": {"type": RelayGroupType.EXCLUSIVE},
+        "B": {"type": RelayGroupType.FORCE_MATCHING},
+    },
+    "relays": {
+        0: {"group_name": "A"},
+        1: {"group_name": "A"},
+        2: {"group_name": "B"},
+        3: {"group_name": "B"},
+    },
+}
+
+# check_matching group E {0,1,2,3}
+_RG_CHECK_MATCHING_0123 = {
+    "groups": {"E": {"type": RelayGroupType.CHECK_MATCHING}},
+    "relays": {0: {"group_name": "E"}, 1: {"group_name": "E"}, 2: {"group_name": "E"}, 3: {"group_name": "E"}},
+}
+
+# synced group S {0,1,2}
+_RG_SYNCED_012 = {
+    "groups": {"S": {"type": RelayGroupType.SYNCED}},
+    "relays": {0: {"group_name": "S"}, 1: {"group_name": "S"}, 2: {"group_name": "S"}},
+}
+
+# synced group S {1,3}
+_RG_SYNCED_13 = {
+    "groups": {"S": {"type": RelayGroupType.SYNCED}},
+    "relays": {1: {"group_name": "S"}, 3: {"group_name": "S"}},
+}
+
+# synced group S {0,1}
+_RG_SYNCED_01 = {
+    "groups": {"S": {"type": RelayGroupType.SYNCED}},
+    "relays": {0: {"group_name": "S"}, 1: {"group_name": "S"}},
+}
+
+# synced group S {0,1} + exclusive group A {2,3}
+_RG_SYNCED_01_EXCLUSIVE_23 = {
+    "groups": {
+        "S": {"type": RelayGroupType.SYNCED},
+        "A": {"type": RelayGroupType.EXCLUSIVE},
+    },
+    "relays": {
+        0: {"group_name": "S"},
+        1: {"group_name": "S"},
+        2: {"group_name": "A"},
+        3: {"group_name": "A"},
+    },
+}
+
+# force_matching group B {1,3}
+_RG_FORCE_MATCHING_13 = {
+    "groups": {"B": {"type": RelayGroupType.FORCE_MATCHING}},
+    "relays": {1: {"group_name": "B"}, 3: {"group_name": "B"}},
+}
+
+# no groups
+_RG_UNGROUPED = {"groups": {}, "relays": {}}
+
+# relay names used by the named-relay tests. NamedRelayGroup only looks names up
+_NAME_TO_INDEX = {"R0": 0, "R1": 1, "R2": 2, "R3": 3}
 
-        announce("turning full group E ON via activate_relay([0,1,2,3]) (expect all on)")
-        b.activate_relay(relay_list=[0, 1, 2, 3])
-        ok &= check(b, [0, 1, 2, 3], "after full activate")
 
-        announce("turning full group E OFF via deactivate_relay([0,1,2,3]) (expect all off)")
-        b.deactivate_relay(relay_list=[0, 1, 2, 3])
-        ok &= check(b, [], "after full deactivate")
-        return ok
-    tests.append(("check_matching group of 4: full toggles only", t10))
+# ---------------- tests ----------------
 
-    # ---------- NEW: SYNCED group tests ----------
+_TESTS = []
+
+def register(name: str):
+    """decorator: add a test function to the registry run() draws from, in definition order."""
+    def _register(fn):
+        _TESTS.append((name, fn))
+        return fn
+    return _register
+
+
+# exclusive group of 2: sequential activate swaps member
+@register("exclusive group of 2: updates via activate_* and write_all_relays")
+def t1():
+    rg = _RG_EXCLUSIVE_02
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("turning on group A by activating relay 0 (exclusive -> expect only 0 on)")
+    b.activate_relay(relay_index=0)
+    diffs |= check_mask(b, 0b0001, "after activate 0")
+
+    announce("switching selection in group A by activating relay 2 (exclusive -> expect only 2 on)")
+    b.activate_relay(relay_index=2)
+    diffs |= check_mask(b, 0b0100, "after activate 2")
+
+    announce("selecting relay 0 in group A via write_all_relays([0]) (exclusive -> expect only 0 on)")
+    b.write_all_relays([0])
+    diffs |= check_mask(b, 0b0001, "after write_all {0}")
+
+    announce("clearing selection in group A via write_all_relays([]) (exclusive -> expect all off)")
+    b.write_all_relays([])
+    diffs |= check_mask(b, 0b0000, "after write_all {}")
+
+    announce("selecting relay 2 in group A via write_all_relays([2]) (exclusive -> expect only 2 on)")
+    b.write_all_relays([2])
+    diffs |= check_mask(b, 0b0100, "after write_all {2}")
+
+    return diffs == 0
+
+# exclusive negative: cannot activate two at once
+@register("exclusive group of 2: activating [0,1] raises")
+def t2():
+    rg = _RG_EXCLUSIVE_01
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+    announce("attempting to activate [0,1] in exclusive group A (expect ValueError)")
+    try:
+        b.activate_relay(relay_list=[0, 1])
+        return False
+    except ValueError:
+        diffs |= check_mask(b, 0b0000, "after rejected multi-activate")
+        return diffs == 0
+
+# force_matching group of 2: single activate -> all on; single deactivate -> all off
+@register("force_matching group of 2: single op applies to entire group")
+def t3():
+    rg = _RG_FORCE_MATCHING_01
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+    announce("turning on all of group B by activating relay 0 (force_matching -> expect {0,1} on)")
+    b.activate_relay(relay_index=0)
+    diffs |= check_mask(b, 0b0011, "after activate 0")
+    announce("turning off all of group B by deactivating relay 1 (force_matching -> expect all off)")
+    b.deactivate_relay(relay_index=1)
+    diffs |= check_mask(b, 0b0000, "after deactivate 1")
+    return diffs == 0
+
+# force_matching toggle: toggle one when off -> all on; toggle again -> all off
+@register("force_matching group of 2: toggles obey group intent")
+def t4():
+    rg = _RG_FORCE_MATCHING_01
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+    announce("turning on all of group B by toggling relay 0 (force_matching -> expect {0,1} on)")
+    b.toggle_relay(relay_index=0)
+    diffs |= check_mask(b, 0b0011, "after toggle 0")
+    announce("turning off all of group B by toggling relay 0 again (force_matching -> expect all off)")
+    b.toggle_relay(relay_index=0)
+    diffs |= check_mask(b, 0b0000, "after toggle 0 again")
+    return diffs == 0
+
+# force_matching mixed intent via write_all: raise on adds+removes conflict
+@register("force_matching: write_all mixed add/remove raises")
+def t5():
+    rg = _RG_FORCE_MATCHING_01
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("creating illegal partial state {0} via raw write (bypasses group logic) to test mixed intent")
+    b._write_all_relays_raw(0b0001)
+    diffs |= check_mask(b, 0b0001, "after raw write {0}")
+
+    announce("requesting desired state {1} via write_all_relays (expect mixed add/remove -> ValueError)")
+    try:
+        b.write_all_relays([1])
+        return False
+    except ValueError:
+        diffs |= check_mask(b, 0b0001, "after rejected mixed-intent write_all")
+        return diffs == 0
+
+# check_matching group of 3: partial ops raise; full ops succeed
+@register("check_matching group of 3: partial operations raise")
+def t6():
+    rg = _RG_CHECK_MATCHING_012
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("attempting partial activate of group C by activating relay 0 (check_matching -> expect ValueError)")
+    try:
+        b.activate_relay(relay_index=0)
+        return False
+    except ValueError:
+        diffs |= check_mask(b, 0b0000, "after rejected partial activate")
+
+    announce("activating the entire group C with [0,1,2] (check_matching -> expect all on)")
+    b.activate_relay(relay_list=[0, 1, 2])
+    diffs |= check_mask(b, 0b0111, "after full activate")
+
+    announce("attempting partial deactivate of group C with [0,1] (check_matching -> expect ValueError)")
+    try:
+        b.deactivate_relay(relay_list=[0, 1])
+        return False
+    except ValueError:
+        diffs |= check_mask(b, 0b0111, "after rejected partial deactivate")
+
+    announce("deactivating the entire group C with [0,1,2] (check_matching -> expect all off)")
+    b.deactivate_relay(relay_list=[0, 1, 2])
+    diffs |= check_mask(b, 0b0000, "after full deactivate")
+    return diffs == 0
+
+# single-member force_matching: behaves like a normal relay
+@register("single-member force_matching: trivial group works")
+def t7():
+    rg = _RG_FORCE_MATCHING_3
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+    announce("turning on group D (size=1) by activating relay 3 (expect relay 3 on)")
+    b.activate_relay(relay_index=3)
+    diffs |= check_mask(b, 0b1000, "after activate 3")
+    announce("turning off group D (size=1) by toggling relay 3 (expect relay 3 off)")
+    b.toggle_relay(relay_index=3)
+    diffs |= check_mask(b, 0b0000, "after toggle 3")
+    return diffs == 0
+
+# mixed: force_matching {0,1} + ungrouped {2}
+@register("mixed: force_matching group with ungrouped channel")
+def t8():
+    rg = _RG_FORCE_MATCHING_01
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+    announce("turning on group B by write_all with {0,2} (expect group coerces to {0,1} and keep ungrouped 2)")
+    b.write_all_relays([0, 2])
+    diffs |= check_mask(b, 0b0111, "after write_all {0,2}")
+    announce("turning off group B while keeping ungrouped 2 by write_all with {2}")
+    b.write_all_relays([2])
+    diffs |= check_mask(b, 0b0100, "after write_all {2}")
+    return diffs == 0
+
+# two groups: exclusive {0,1} + force_matching {2,3}
+@register("two groups: exclusive {0,1} + force_matching {2,3}")
+def t9():
+    rg = _RG_EXCLUSIVE_01_FORCE_MATCHING_23
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("selecting relay 0 in exclusive group A (expect only 0 on)")
+    b.activate_relay(relay_index=0)
+    diffs |= check_mask(b, 0b0001, "after activate 0 in A")
+
+    announce("selecting relay 1 in exclusive group A and turning on group B by write_all {1,3}")
+    b.write_all_relays([1, 3])
+    diffs |= check_mask(b, 0b1110, "after write_all {1,3}")
+
+    announce("turning off group B by toggling relay 2 (exclusive group A remains on relay 1)")
+    b.toggle_relay(relay_index=2)
+    diffs |= check_mask(b, 0b0010, "after toggle 2 in B")
+    return diffs == 0
+
+# check_matching group of 4: full operations only (toggle list removed)
+@register("check_matching group of 4: full toggles only")
+def t10():
+    rg = _RG_CHECK_MATCHING_0123
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("attempting single toggle of group E by toggling relay 0 (check_matching -> expect ValueError)")
+    try:
+        b.toggle_relay(relay_index=0)
+        return False
+    except ValueError:
+        diffs |= check_mask(b, 0b0000, "after rejected single toggle")
+
+    announce("turning full group E ON via activate_relay([0,1,2,3]) (expect all on)")
+    b.activate_relay(relay_list=[0, 1, 2, 3])
+    diffs |= check_mask(b, 0b1111, "after full activate")
+
+    announce("turning full group E OFF via deactivate_relay([0,1,2,3]) (expect all off)")
+    b.deactivate_relay(relay_list=[0, 1, 2, 3])
+    diffs |= check_mask(b, 0b0000, "after full deactivate")
+    return diffs == 0
+
+# ---------- NEW: SYNCED group tests ----------
+
+# SYNCED group of 3: write_all allows mixed state if the whole group is updated
+@register("synced group of 3: write_all accepts full-group mixed updates; rejects partial")
+def t11():
+    rg = _RG_SYNCED_012
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("writing full SYNCED group S with mixed state via write_all {0,2} (expect 0,2 on; 1 off)")
+    b.write_all_relays([0, 2])
+    diffs |= check_mask(b, 0b0101, "after write_all {0,2}")
+
+    announce("writing full SYNCED group S via write_all {0} (still a full-group update; expect only 0 on)")
+    b.write_all_relays([0])
+    diffs |= check_mask(b, 0b0001, "after write_all {0}")
+
+
+    announce("writing full SYNCED group S with new mix via write_all {1} (expect only 1 on)")
+    b.write_all_relays([1])
+    diffs |= check_mask(b, 0b0010, "after write_all {1}")
+    return diffs == 0
+
+# SYNCED group of 2: single-member activate/deactivate rejected; full-list accepted
+@register("synced group of 2: single-member ops rejected; full-list ops accepted")
+def t12():
+    rg = _RG_SYNCED_13
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("attempting single-member activate relay 1 in SYNCED S -> expect ValueError")
+    try:
+        b.activate_relay(relay_index=1)
+        return False
+    except ValueError:
+        diffs |= check_mask(b, 0b0000, "after rejected single-member activate on S")
+
+    announce("activating full SYNCED group S via activate_relay([1,3]) -> expect {1,3} on")
+    b.activate_relay(relay_list=[1, 3])
+    diffs |= check_mask(b, 0b1010, "after full activate S")
+
+    announce("deactivating full SYNCED group S via deactivate_relay([1,3]) -> expect all off")
+    b.deactivate_relay(relay_list=[1, 3])
+    diffs |= check_mask(b, 0b0000, "after full deactivate S")
+    return diffs == 0
+
+# SYNCED: single-member toggle is forbidden
+@register("synced: single-member toggle rejected")
+def t13():
+    rg = _RG_SYNCED_01
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("attempting single-member toggle on SYNCED group S (relay 0) -> expect ValueError")
+    try:
+        b.toggle_relay(relay_index=0)
+        return False
+    except ValueError:
+        diffs |= check_mask(b, 0b0000, "after rejected single toggle on S")
+        return diffs == 0
+
+
+# SYNCED + ungrouped: full-group update with extra ungrouped allowed
+@register("synced + ungrouped: full-group updates allowed; partial rejected")
+def t14():
+    rg = _RG_SYNCED_01
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("write_all {0,2} (S is updated in this call, mixed allowed) -> expect {0,2} on")
+    b.write_all_relays([0, 2])
+    diffs |= check_mask(b, 0b0101, "after write_all {0,2}")
+
+    announce("write_all {1} (flip S mix, ungrouped 2 goes off) -> expect {1} on")
+    b.write_all_relays([1])
+    diffs |= check_mask(b, 0b0010, "after write_all {1}")
+    return diffs == 0
+
+
+# SYNCED with EXCLUSIVE present: write_all must satisfy both policies
+@register("synced + exclusive: combined policy enforcement")
+def t15():
+    rg = _RG_SYNCED_01_EXCLUSIVE_23
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("write_all {0,2} -> S updated in one call (mixed allowed), A selects 2 -> expect {0,2} on")
+    b.write_all_relays([0, 2])
+    diffs |= check_mask(b, 0b0101, "after write_all {0,2}")
+
+    announce("write_all {1,3} -> S updated (mixed allowed), A switches selection to 3 -> expect {1,3} on")
+    b.write_all_relays([1, 3])
+    diffs |= check_mask(b, 0b1010, "after write_all {1,3}")
+    return diffs == 0
+
+
+# t16: Named relays + EXCLUSIVE group {R0, R2} using NamedRelayGroup helpers
+@register("Named relays + EXCLUSIVE group {R0, R2} using NamedRelayGroup helpers")
+def t16():
+    # build relay_groups config (EXCLUSIVE group A with members 0 and 2)
+    rg = _RG_EXCLUSIVE_02
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+
+    # named single relays
+    R0 = NamedRelay(board_name="board", board=b, index=0, name="R0")
+    R2 = NamedRelay(board_name="board", board=b, index=2, name="R2")
+
+    # named group
+    G = NamedRelayGroup(
+        board_name="board",
+        board=b,
+        name="A",
+        members=[0, 2],
+        gtype=RelayGroupType.EXCLUSIVE,
+        name_to_index=_NAME_TO_INDEX,
+    )
 
-    # SYNCED group of 3: write_all allows mixed state if the whole group is updated
-    def t11():
-        rg = {
-            "groups": {"S": {"type": RelayGroupType.SYNCED}},
-            "relays": {0: {"group_name": "S"}, 1: {"group_name": "S"}, 2: {"group_name": "S"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
+    diffs |= check_mask(b, 0b0000, "initial state")
 
-        ok &= check(b, [], "initial state")
+    announce("activate_exclusive('R0') on EXCLUSIVE A (expect only 0 on)")
+    G.activate_exclusive("R0")
+    diffs |= check_mask(b, 0b0001, "after G.activate_exclusive('R0')")
 
-        announce("writing full SYNCED group S with mixed state via write_all {0,2} (expect 0,2 on; 1 off)")
-        b.write_all_relays([0, 2])
-        ok &= check(b, [0, 2], "after write_all {0,2}")
+    announce("activate_exclusive('R2') on EXCLUSIVE A (expect only 2 on)")
+    G.activate_exclusive("R2")
+    diffs |= check_mask(b, 0b0100, "after G.activate_exclusive('R2')")
 
-        announce("writing full SYNCED group S via write_all {0} (still a full-group update; expect only 0 on)")
-        b.write_all_relays([0])
-        ok &= check(b, [0], "after write_all {0}")
+    announce("NamedRelay.activate() on R0 (expects selection switch to 0)")
+    R0.activate()
+    diffs |= check_mask(b, 0b0001, "after R0.activate()")
 
+    announce("NamedRelay.deactivate() on R2 (no change since R2 is off)")
+    R2.deactivate()
+    diffs |= check_mask(b, 0b0001, "after R2.deactivate()")
 
-        announce("writing full SYNCED group S with new mix via write_all {1} (expect only 1 on)")
-        b.write_all_relays([1])
-        ok &= check(b, [1], "after write_all {1}")
-        return ok
-    tests.append(("synced group of 3: write_all accepts full-group mixed updates; rejects partial", t11))
-
-    # SYNCED group of 2: single-member activate/deactivate rejected; full-list accepted
-    def t12():
-        rg = {
-            "groups": {"S": {"type": RelayGroupType.SYNCED}},
-            "relays": {1: {"group_name": "S"}, 3: {"group_name": "S"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-
-        ok &= check(b, [], "initial state")
-
-        announce("attempting single-member activate relay 1 in SYNCED S -> expect ValueError")
-        try:
-            b.activate_relay(relay_index=1)
-            return False
-        except ValueError:
-            ok &= check(b, [], "after rejected single-member activate on S")
-
-        announce("activating full SYNCED group S via activate_relay([1,3]) -> expect {1,3} on")
-        b.activate_relay(relay_list=[1, 3])
-        ok &= check(b, [1, 3], "after full activate S")
-
-        announce("deactivating full SYNCED group S via deactivate_relay([1,3]) -> expect all off")
-        b.deactivate_relay(relay_list=[1, 3])
-        ok &= check(b, [], "after full deactivate S")
-        return ok
-    tests.append(("synced group of 2: single-member ops rejected; full-list ops accepted", t12))
-
-    # SYNCED: single-member toggle is forbidden
-    def t13():
-        rg = {
-            "groups": {"S": {"type": RelayGroupType.SYNCED}},
-            "relays": {0: {"group_name": "S"}, 1: {"group_name": "S"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-
-        ok &= check(b, [], "initial state")
-
-        announce("attempting single-member toggle on SYNCED group S (relay 0) -> expect ValueError")
-        try:
-            b.toggle_relay(relay_index=0)
-            return False
-        except ValueError:
-            ok &= check(b, [], "after rejected single toggle on S")
-            return ok
-    tests.append(("synced: single-member toggle rejected", t13))
+    return diffs == 0
 
+# t17: Named relays + FORCE_MATCHING group {R1, R3} with ungrouped R2
+@register("Named relays + FORCE_MATCHING group {R1, R3} with ungrouped R2")
+def t17():
+    rg = _RG_FORCE_MATCHING_13
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
 
-    # SYNCED + ungrouped: full-group update with extra ungrouped allowed
-    def t14():
-        rg = {
-            "groups": {"S": {"type": RelayGroupType.SYNCED}},
-            "relays": {0: {"group_name": "S"}, 1: {"group_name": "S"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
+    R1 = NamedRelay(board_name="board", board=b, index=1, name="R1")
+    R2 = NamedRelay(board_name="board", board=b, index=2, name="R2")
 
-        ok &= check(b, [], "initial state")
-
-        announce("write_all {0,2} (S is updated in this call, mixed allowed) -> expect {0,2} on")
-        b.write_all_relays([0, 2])
-        ok &= check(b, [0, 2], "after write_all {0,2}")
+    G = NamedRelayGroup(
+        board_name="board",
+        board=b,
+        name="B",
+        members=[1, 3],
+        gtype=RelayGroupType.FORCE_MATCHING,
+        name_to_index=_NAME_TO_INDEX,
+    )
 
-        announce("write_all {1} (flip S mix, ungrouped 2 goes off) -> expect {1} on")
-        b.write_all_relays([1])
-        ok &= check(b, [1], "after write_all {1}")
-        return ok
-
-
-    tests.append(("synced + ungrouped: full-group updates allowed; partial rejected", t14))
-
-
-    # SYNCED with EXCLUSIVE present: write_all must satisfy both policies
-    def t15():
-        rg = {
-            "groups": {
-                "S": {"type": RelayGroupType.SYNCED},
-                "A": {"type": RelayGroupType.EXCLUSIVE},
-            },
-            "relays": {
-                0: {"group_name": "S"},
-                1: {"group_name": "S"},
-                2: {"group_name": "A"},
-                3: {"group_name": "A"},
-            },
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-
-        ok &= check(b, [], "initial state")
-
-        announce("write_all {0,2} -> S updated in one call (mixed allowed), A selects 2 -> expect {0,2} on")
-        b.write_all_relays([0, 2])
-        ok &= check(b, [0, 2], "after write_all {0,2}")
-
-        announce("write_all {1,3} -> S updated (mixed allowed), A switches selection to 3 -> expect {1,3} on")
-        b.write_all_relays([1, 3])
-        ok &= check(b, [1, 3], "after write_all {1,3}")
-        return ok
-
-    tests.append(("synced + exclusive: combined policy enforcement", t15))
-
-    # t16: Named relays + EXCLUSIVE group {R0, R2} using NamedRelayGroup helpers
-    def t16():
-        # build relay_groups config (EXCLUSIVE group A with members 0 and 2)
-        rg = {
-            "groups": {"A": {"type": RelayGroupType.EXCLUSIVE}},
-            "relays": {0: {"group_name": "A"}, 2: {"group_name": "A"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-
-        # name mapping
-        name_to_index = {"R0": 0, "R1": 1, "R2": 2, "R3": 3}
-
-        # named single relays
-        R0 = NamedRelay(board_name="board", board=b, index=0, name="R0")
-        R2 = NamedRelay(board_name="board", board=b, index=2, name="R2")
-
-        # named group
-        G = NamedRelayGroup(
-            board_name="board",
-            board=b,
-            name="A",
-            members=[0, 2],
-            gtype=RelayGroupType.EXCLUSIVE,
-            name_to_index=name_to_index,
-        )
+    diffs |= check_mask(b, 0b0000, "initial state")
 
-        ok &= check(b, [], "initial state")
-
-        announce("activate_exclusive('R0') on EXCLUSIVE A (expect only 0 on)")
-        G.activate_exclusive("R0")
-        ok &= check(b, [0], "after G.activate_exclusive('R0')")
-
-        announce("activate_exclusive('R2') on EXCLUSIVE A (expect only 2 on)")
-        G.activate_exclusive("R2")
-        ok &= check(b, [2], "after G.activate_exclusive('R2')")
-
-        announce("NamedRelay.activate() on R0 (expects selection switch to 0)")
-        R0.activate()
-        ok &= check(b, [0], "after R0.activate()")
-
-        announce("NamedRelay.deactivate() on R2 (no change since R2 is off)")
-        R2.deactivate()
-        ok &= check(b, [0], "after R2.deactivate()")
-
-        return ok
-    tests.append(("Named relays + EXCLUSIVE group {R0, R2} using NamedRelayGroup helpers", t16))
-
-    # t17: Named relays + FORCE_MATCHING group {R1, R3} with ungrouped R2
-    def t17():
-        rg = {
-            "groups": {"B": {"type": RelayGroupType.FORCE_MATCHING}},
-            "relays": {1: {"group_name": "B"}, 3: {"group_name": "B"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-
-        name_to_index = {"R0": 0, "R1": 1, "R2": 2, "R3": 3}
-        R1 = NamedRelay(board_name="board", board=b, index=1, name="R1")
-        R2 = NamedRelay(board_name="board", board=b, index=2, name="R2")
-
-        G = NamedRelayGroup(
-            board_name="board",
-            board=b,
-            name="B",
-            members=[1, 3],
-            gtype=RelayGroupType.FORCE_MATCHING,
-            name_to_index=name_to_index,
-        )
+    announce("R1.activate() in FORCE_MATCHING B (expect {1,3} on)")
+    R1.activate()
+    diffs |= check_mask(b, 0b1010, "after R1.activate()")
 
-        ok &= check(b, [], "initial state")
+    announce("G.deactivate_all() to turn B off, then R2.activate() (expect {2} on)")
+    G.deactivate_all()
+    R2.activate()
+    diffs |= check_mask(b, 0b0100, "after G.deactivate_all() + R2.activate()")
 
-        announce("R1.activate() in FORCE_MATCHING B (expect {1,3} on)")
-        R1.activate()
-        ok &= check(b, [1, 3], "after R1.activate()")
+    announce("G.activate_all() (expect {1,3,2} on -> group on + R2 preserved)")
+    G.activate_all()
+    diffs |= check_mask(b, 0b1110, "after G.activate_all()")
 
-        announce("G.deactivate_all() to turn B off, then R2.activate() (expect {2} on)")
-        G.deactivate_all()
-        R2.activate()
-        ok &= check(b, [2], "after G.deactivate_all() + R2.activate()")
+    return diffs == 0
 
-        announce("G.activate_all() (expect {1,3,2} on -> group on + R2 preserved)")
-        G.activate_all()
-        ok &= check(b, [1, 2, 3], "after G.activate_all()")
 
-        return ok
+# t18: SeqGuard delay — ensure min spacing between ops is enforced
+@register("SeqGuard delay — ensure min spacing between ops is enforced")
+def t18():
+    SEQ_MS = 100  # measurable on real hardware
+    rg = _RG_UNGROUPED
 
-    tests.append(("Named relays + FORCE_MATCHING group {R1, R3} with ungrouped R2", t17))
+    b = make_board(rg, seq_delay_ms=SEQ_MS)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
 
-    # t18: SeqGuard delay — ensure min spacing between ops is enforced
-    def t18():
-        SEQ_MS = 100  # measurable on real hardware
-        rg = {"groups": {}, "relays": {}}
+    announce(f"timing test: activate(0) then immediately deactivate(0); "
+             f"expect the second call to take ≥ {SEQ_MS} ms due to seq guard")
 
-        b = make_board(rg, seq_delay_ms=SEQ_MS)
-        print_config(rg)
-        ok = True
-        ok &= check(b, [], "initial state")
+    # first transaction: turn relay 0 ON (engages guard)
+    b.activate_relay(relay_index=0)
+    diffs |= check_mask(b, 0b0001, "after activate 0")
 
-        announce(f"timing test: activate(0) then immediately deactivate(0); "
-                 f"expect the second call to take ≥ {SEQ_MS} ms due to seq guard")
+    if SEQ_MS == 0:
+        # nothing to time without a guard delay
+        b.deactivate_relay(relay_index=0)
+        diffs |= check_mask(b, 0b0000, "after deactivate 0")
+        return diffs == 0
+
+    # second transaction: should be held by the guard for ~SEQ_MS
+    t0 = time.perf_counter_ns()
+    b.deactivate_relay(relay_index=0)
+    elapsed_ms = (time.perf_counter_ns() - t0) / 1_000_000
+
+    logging.info("seqguard measured elapsed for 2nd op: %.1f ms (seq_delay_ms=%d)",
+                 elapsed_ms, SEQ_MS)
+
+    # allow some jitter, but it should be close to (or above) the configured delay
+    timing_ok = elapsed_ms >= 0.9 * SEQ_MS
+
+    # sanity: ended OFF
+    diffs |= check_mask(b, 0b0000, "after deactivate 0")
+
+    return diffs == 0 and timing_ok
+
+# test 19: named group + SYNCED with update_group()
+@register("named group + SYNCED with update_group()")
+def t19():
+    rg = _RG_SYNCED_012
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+
+    S = NamedRelayGroup(
+        board_name="board",
+        board=b,
+        name="S",
+        members=[0, 1, 2],
+        gtype=RelayGroupType.SYNCED,
+        name_to_index=_NAME_TO_INDEX,
+    )
 
-        # first transaction: turn relay 0 ON (engages guard)
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("S.update_group(['R0','R2']) -> expect 0,2 on; 1 off")
+    S.update_group(["R0", "R2"])
+    diffs |= check_mask(b, 0b0101, "after S.update_group(['R0','R2'])")
+
+    announce("S.update_group([]) -> expect all S off")
+    S.update_group([])
+    diffs |= check_mask(b, 0b0000, "after S.update_group([])")
+    return diffs == 0
+
+# test 20: batch() coalesces writes; nested blocks commit once
+@register("batch(): changes are written once, when the outermost block exits")
+def t20():
+    rg = _RG_EXCLUSIVE_01
+    b = _RecordingRelayBoard(num_relays=4, relay_groups=rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("in a batch: activate 0, activate 1 (exclusive swap), activate 2 "
+             "(expect nothing written until exit, reads see {1,2})")
+    with b.batch():
+        b.activate_relay(relay_index=0)
+        b.activate_relay(relay_index=1)
+        b.activate_relay(relay_index=2)
+        diffs |= check_mask(b, 0b0000, "inside batch (hardware)")
+        pending_ok = RelayBase.read_all_relays(b) == (1, 2) and b.is_relay_active(2)
+        held_ok = b.writes == []
+    diffs |= check_mask(b, 0b0110, "after batch")
+
+    # relay 0 was only ever on in the pending state, so it is never written
+    coalesced_ok = sorted(b.writes) == [(1, 1), (2, 1)]
+
+    announce("nested batches: deactivate 2 in the outer, activate 0 in the inner "
+             "(expect nothing written until the outer block exits)")
+    b.writes.clear()
+    with b.batch():
+        b.deactivate_relay(relay_index=2)
+        with b.batch():
+            b.activate_relay(relay_index=0)
+        held_ok &= b.writes == []
+        diffs |= check_mask(b, 0b0110, "after inner batch")
+    diffs |= check_mask(b, 0b0001, "after outer batch")
+
+    nested_ok = sorted(b.writes) == [(0, 1), (1, 0), (2, 0)]
+
+    logging.info("writes held: %s pending reads: %s coalesced: %s nested: %s",
+                 held_ok, pending_ok, coalesced_ok, nested_ok)
+    return diffs == 0 and held_ok and pending_ok and coalesced_ok and nested_ok
+
+# test 21: blocking auto_off inside batch() is rejected
+@register("batch(): blocking auto_off_ms raises and the batch is unaffected")
+def t21():
+    rg = _RG_UNGROUPED
+    b = _RecordingRelayBoard(num_relays=4, relay_groups=rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("in a batch: activate 0, then activate 3 with a blocking auto_off_ms "
+             "(expect ValueError, only 0 written on exit)")
+    rejected = False
+    with b.batch():
         b.activate_relay(relay_index=0)
-        ok &= check(b, [0], "after activate 0")
+        try:
+            b.activate_relay(relay_index=3, auto_off_ms=10, blocking=True)
+        except ValueError:
+            rejected = True
+    diffs |= check_mask(b, 0b0001, "after batch")
+
+    return diffs == 0 and rejected and b.writes == [(0, 1)]
+
+# test 22: write_all_relays_mask applies and rejects like write_all_relays
+@register("write_all_relays_mask: group rules apply, bad masks raise")
+def t22():
+    rg = _RG_EXCLUSIVE_01_FORCE_MATCHING_23
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("write_all_relays_mask(0b0001) (expect only 0 on)")
+    b.write_all_relays_mask(0b0001)
+    diffs |= check_mask(b, 0b0001, "after mask 0b0001")
+
+    announce("write_all_relays_mask(0b0110) (force_matching B fills in -> expect {1,2,3} on)")
+    b.write_all_relays_mask(0b0110)
+    diffs |= check_mask(b, 0b1110, "after mask 0b0110")
+
+    announce("write_all_relays_mask(0b0011) (two on in exclusive A -> expect ValueError)")
+    try:
+        b.write_all_relays_mask(0b0011)
+        return False
+    except ValueError:
+        diffs |= check_mask(b, 0b1110, "after rejected mask 0b0011")
+
+    announce("write_all_relays_mask(0b1010) (relay 2 dropped from force_matching B -> expect only 1 on)")
+    b.write_all_relays_mask(0b1010)
+    diffs |= check_mask(b, 0b0010, "after mask 0b1010")
+
+    for bad in (1 << 4, -1):
+        announce(f"write_all_relays_mask({bad}) (out of range -> expect IndexError)")
+        try:
+            b.write_all_relays_mask(bad)
+            return False
+        except IndexError:
+            diffs |= check_mask(b, 0b0010, f"after rejected mask {bad}")
+
+    return diffs == 0
+
+# test 23: auto-off deadlines fire in deadline order, relays switched off by hand are left alone
+@register("auto_off_ms: relays switch off in deadline order, manual offs are not rewritten")
+def t23():
+    rg = _RG_UNGROUPED
+    b = _RecordingRelayBoard(num_relays=4, relay_groups=rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("activate 0/1/2 with auto_off_ms 120/40/80 (expect offs in order 1, 2, 0)")
+    b.activate_relay(relay_index=0, auto_off_ms=120)
+    b.activate_relay(relay_index=1, auto_off_ms=40)
+    b.activate_relay(relay_index=2, auto_off_ms=80)
+    diffs |= check_mask(b, 0b0111, "after activates")
+    time.sleep(0.25)
+    diffs |= check_mask(b, 0b0000, "after all deadlines")
+    order_ok = [i for i, on in b.writes if not on] == [1, 2, 0]
+
+    announce("activate 3 with auto_off_ms 40, deactivate it by hand "
+             "(expect no further write at the deadline)")
+    b.activate_relay(relay_index=3, auto_off_ms=40)
+    b.deactivate_relay(relay_index=3)
+    b.writes.clear()
+    time.sleep(0.1)
+    diffs |= check_mask(b, 0b0000, "after deadline")
+    manual_ok = b.writes == []
+
+    logging.info("deadline order: %s manual off untouched: %s", order_ok, manual_ok)
+    return diffs == 0 and order_ok and manual_ok
+
+# test 24: an auto-off that falls due inside a long batch() still switches the relay off
+@register("auto_off_ms: a deadline inside a long batch() still switches the relay off")
+def t24():
+    rg = _RG_UNGROUPED
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("in a batch: activate 0 with auto_off_ms 10, hold the batch for 100 ms "
+             "(expect 0 off shortly after the batch exits)")
+    with b.batch():
+        b.activate_relay(relay_index=0, auto_off_ms=10)
+        time.sleep(0.1)
+    # the worker was held off by the batch and switches the relay off as
+    # soon as it exits, so only the end state is checked
+    time.sleep(0.1)
+    diffs |= check_mask(b, 0b0000, "after auto off")
+    return diffs == 0
+
+# test 25: thread_safe=False board
+@register("thread_safe=False: group logic and blocking auto_off work, non-blocking auto_off raises")
+def t25():
+    rg = _RG_EXCLUSIVE_01
+    b = TestRelayBoard(num_relays=4, relay_groups=rg, thread_safe=False)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("activate 0, activate 1, toggle 2 (exclusive A -> expect {1,2} on)")
+    b.activate_relay(relay_index=0)
+    b.activate_relay(relay_index=1)
+    b.toggle_relay(relay_index=2)
+    diffs |= check_mask(b, 0b0110, "after activates")
+
+    announce("batch: deactivate 1, activate 3 (expect {2,3} on)")
+    with b.batch():
+        b.deactivate_relay(relay_index=1)
+        b.activate_relay(relay_index=3)
+    diffs |= check_mask(b, 0b1100, "after batch")
+
+    announce("activate 0 with a blocking auto_off_ms of 20 (expect it back off on return)")
+    b.activate_relay(relay_index=0, auto_off_ms=20, blocking=True)
+    diffs |= check_mask(b, 0b1100, "after blocking auto_off")
+
+    announce("activate 0 with a non-blocking auto_off_ms (expect ValueError, nothing changed)")
+    try:
+        b.activate_relay(relay_index=0, auto_off_ms=20)
+        return False
+    except ValueError:
+        diffs |= check_mask(b, 0b1100, "after rejected auto_off")
+
+    return diffs == 0
+
+# test 26: read_all_relays(force=True) re-reads the hardware
+@register("read_all_relays(force=True): one _read_all_relays_hw query, else read_relay per relay")
+def t26():
+    rg = _RG_UNGROUPED
+    print_config(rg)
+    diffs = 0
+    reads_ok = True
+
+    for use_hook in (True, False):
+        b = _HwReadRelayBoard(num_relays=4, relay_groups=rg, use_hook=use_hook)
+        diffs |= check_mask(b, 0b0000, "initial state")
+
+        announce(f"activate 0, then switch 3 on behind the board's back (use_hook={use_hook})")
+        b.activate_relay(relay_index=0)
+        b._relay_status[3] = 1
 
-        # second transaction: should be held by the guard for ~SEQ_MS
-        import time
-        t0 = time.monotonic()
-        b.deactivate_relay(relay_index=0)
-        t1 = time.monotonic()
-        elapsed_ms = (t1 - t0) * 1000.0
-
-        logging.info("seqguard measured elapsed for 2nd op: %.1f ms (seq_delay_ms=%d)",
-                     elapsed_ms, SEQ_MS)
-
-        # allow some jitter, but it should be close to (or above) the configured delay
-        ok &= (elapsed_ms >= 0.9 * SEQ_MS)
-
-        # sanity: ended OFF
-        ok &= check(b, [], "after deactivate 0")
-
-        return ok
-    tests.append(("SeqGuard delay — ensure min spacing between ops is enforced", t18))
-
-    # test 19: named group + SYNCED with update_group()
-    def t19():
-        rg = {
-            "groups": {"S": {"type": RelayGroupType.SYNCED}},
-            "relays": {0: {"group_name": "S"}, 1: {"group_name": "S"}, 2: {"group_name": "S"}},
-        }
-        b = make_board(rg)
-        print_config(rg)
-        ok = True
-
-        name_to_index = {"R0": 0, "R1": 1, "R2": 2, "R3": 3}
-        S = NamedRelayGroup(
-            board_name="board",
-            board=b,
-            name="S",
-            members=[0, 1, 2],
-            gtype=RelayGroupType.SYNCED,
-            name_to_index=name_to_index,
-        )
+        announce("read_all_relays() (expect the cached state (0,), no hardware read)")
+        reads_ok &= RelayBase.read_all_relays(b) == (0,)
+        reads_ok &= b.hw_reads == 0 and b.relay_reads == 0
+
+        announce("read_all_relays(force=True) (expect (0, 3) from the hardware)")
+        reads_ok &= RelayBase.read_all_relays(b, force=True) == (0, 3)
+        if use_hook:
+            reads_ok &= b.hw_reads == 1 and b.relay_reads == 0
+        else:
+            reads_ok &= b.hw_reads == 0 and b.relay_reads == 4
+
+        announce("deactivate 3 (expect it written now the board knows it is on)")
+        b.deactivate_relay(relay_index=3)
+        diffs |= check_mask(b, 0b0001, "after deactivate 3")
+
+    return diffs == 0 and reads_ok
+
+# test 27: relays switching off are written before relays switching on
+@register("break before make: relays turning off are written before any turning on")
+def t27():
+    rg = _RG_EXCLUSIVE_01
+    b = _RecordingRelayBoard(num_relays=4, relay_groups=rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    b.activate_relay(relay_index=0)
+    b.writes.clear()
+    announce("activate 1 with 0 on (exclusive swap -> expect 0 off written before 1 on)")
+    b.activate_relay(relay_index=1)
+    diffs |= check_mask(b, 0b0010, "after activate 1")
+    swap_ok = b.writes == [(0, 0), (1, 1)]
+
+    b.writes.clear()
+    announce("write_all_relays_mask(0b1001) (expect 1 off written before 0 and 3 on)")
+    b.write_all_relays_mask(0b1001)
+    diffs |= check_mask(b, 0b1001, "after mask 0b1001")
+    bulk_ok = b.writes == [(1, 0), (0, 1), (3, 1)]
+
+    logging.info("writes in order: swap %s bulk %s", swap_ok, bulk_ok)
+    return diffs == 0 and swap_ok and bulk_ok
+
+# test 28: is_relay_active bounds checks its index
+@register("is_relay_active: reports relay state, out of range index raises IndexError")
+def t28():
+    rg = _RG_EXCLUSIVE_02
+    b = make_board(rg)
+    print_config(rg)
+    diffs = 0
+    diffs |= check_mask(b, 0b0000, "initial state")
+
+    announce("activate 2 (expect is_relay_active true for 2 only)")
+    b.activate_relay(relay_index=2)
+    diffs |= check_mask(b, 0b0100, "after activate 2")
+    active_ok = [b.is_relay_active(i) for i in range(4)] == [False, False, True, False]
+
+    for bad in (-1, 4):
+        announce(f"is_relay_active({bad}) (expect IndexError)")
+        try:
+            b.is_relay_active(bad)
+            return False
+        except IndexError:
+            pass
+
+    return diffs == 0 and active_ok
 
-        ok &= check(b, [], "initial state")
 
-        announce("S.update_group(['R0','R2']) -> expect 0,2 on; 1 off")
-        S.update_group(["R0", "R2"])
-        ok &= check(b, [0, 2], "after S.update_group(['R0','R2'])")
+def run(serial: bool | None = None, pattern: str | None = None):
+    """
+    run the registered tests, or only those whose name matches the regex
+    pattern. tests are independent boards, so unless serial is set they
+    run concurrently. defaults to serial when driving real hardware since every
+    test opens the same serial port. with FAIL_FAST the report stops at the first
+    failure; in serial mode the remaining tests are not run at all.
+    """
+    if serial is None:
+        serial = USE_NUMATO
 
-        announce("S.update_group([]) -> expect all S off")
-        S.update_group([])
-        ok &= check(b, [], "after S.update_group([])")
-        return ok
-    tests.append(("named group + SYNCED with update_group()", t19))
+    rx = re.compile(pattern) if pattern else None
+    tests = [(num, name, fn) for num, (name, fn) in enumerate(_TESTS, start=1)
+             if rx is None or rx.search(name)]
 
     passed = 0
     failed = 0
     failed_tests = []
 
-    for name, fn in tests:
-        print_header(tnum, name)
-
-        # print configuration before running the test (best-effort, tests also print it)
-        try:
-            rg = fn.__defaults__[0] if fn.__defaults__ else None
-            if isinstance(rg, dict):
-                print_config(rg)
-        except Exception:
-            pass
-
-        ok = False
-        try:
-            ok = fn()
-        except Exception:
-            logging.exception("unexpected error during %s", name)
-            ok = False
-
-        print_result(ok)
-        if ok:
-            passed += 1
-        else:
-            failed += 1
-            failed_tests.append(f"test {tnum}: {name}")
-
-        tnum += 1
+    with _buffered_logging() as logs:
+        outcomes = None
+        if not serial:
+            stdout = sys.stdout
+            out = _ThreadStdout(stdout)
+            sys.stdout = out
+            try:
+                outcomes = asyncio.run(_run_concurrently([(name, fn) for _, name, fn in tests],
+                                                         out, logs))
+            finally:
+                sys.stdout = stdout
+
+        for idx, (tnum, name, fn) in enumerate(tests):
+            print_header(tnum, name)
+
+            if outcomes is None:
+                ok = _run_test(name, fn)
+            else:
+                # this test's output then its log records, as a serial run
+                # would have written them
+                ok, output, records = outcomes[idx]
+                sys.stdout.write(output)
+                sys.stdout.flush()
+                logs.replay(records)
+
+            logs.flush()
+            print_result(ok)
+            if ok:
+                passed += 1
+            else:
+                failed += 1
+                failed_tests.append(f"test {tnum}: {name}")
+
+            if not ok and FAIL_FAST:
+                break
 
 
     total = passed + failed
@@ -737,6 +1272,8 @@ def run():
     print(f"Total tests: {total}")
     print(f"Passed: {passed}")
     print(f"Failed: {failed}")
+    if total < len(tests):
+        print(f"Skipped (fail fast): {len(tests) - total}")
     if failed_tests:
         print("Failed tests:")
         for t in failed_tests:
@@ -744,5 +1281,38 @@ def run():
     print("=" * 31)
 
 if __name__ == "__main__":
-    run()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="exercise RelayBase group logic")
+    parser.add_argument('--serial',
+                        help = "run tests one at a time (always the case on the numato board)",
+                        action = 'store_true')
+    parser.add_argument('--fake',
+                        help = "use the in-memory TestRelayBoard instead of the numato board",
+                        action = 'store_true')
+    parser.add_argument('--quiet',
+                        '-q',
+                        help = "only print the summary and warnings (same as RELAY_VERBOSE=0)",
+                        action = 'store_true')
+    parser.add_argument('--filter',
+                        '-f',
+                        help = "only run tests whose name matches this regexp",
+                        type=str,
+                        required=False)
+    args = parser.parse_args()
+
+    if args.fake:
+        USE_NUMATO = False
+    if args.quiet:
+        VERBOSE = False
+
+    # the summary is all a quiet run wants to see, so drop the DEBUG/INFO
+    # chatter on stderr as well
+    if not VERBOSE:
+        root = logging.getLogger()
+        root.setLevel(logging.WARNING)
+        for h in root.handlers:
+            h.setLevel(logging.WARNING)
+
+    run(serial = args.serial or USE_NUMATO, pattern = args.filter)
 
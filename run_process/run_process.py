@@ -28,19 +28,206 @@
 ################################################################################
 """ Module providing ability to run a process and grab relevant output """
 
+import asyncio
+import collections
+import concurrent.futures
 import logging
-import multiprocessing
+import os
 import subprocess
 import re
 import time
 import signal
 import psutil
 
+# optional. when available every response pattern is matched against a line
+# in a single hyperscan pass instead of going through python's re
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
 # Create a logging object with a null handler. if the caller of this class
 # does not configure a logger context then no messages will be printed.
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# how much of the process' stdout to read at a time
+_READ_CHUNK = 65536
+
+# on posix 'cmd' runs in its own session so everything it spawns can be killed
+# as one process group, including a child forked while we're killing it
+_NEW_SESSION = os.name == "posix"
+
+# how long 'cmd' gets to exit after SIGTERM before it's killed outright. windows
+# has no SIGKILL, but SIGTERM there already terminates the process
+_KILL_GRACE_S = 0.5
+_SIGKILL = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+# numbered or named backreference in a response regex
+_BACKREF = re.compile(r"\\[1-9]|\(\?P=")
+
+# regex syntax that would change meaning if the pattern were lowercased: escapes
+# other than \d \s \w \b and the whitespace ones (\D, \S, \x41, \N{...}, ...),
+# '(?' groups ((?P<name>, inline flags, ...) and character classes, whose
+# ranges ([A-z], [Z-a]) cover different chars once lowercased
+_CASE_SENSITIVE_SYNTAX = re.compile(r"\\[^dswbntrf\W]|\(\?|\[")
+
+# global inline flags at the start of a response regex, e.g. '(?i)error'. they
+# can't be moved inside a group
+_LEADING_FLAGS = re.compile(r"\(\?[aiLmsux]+\)")
+
+# any regex metacharacter. a response without one is a plain string
+_REGEX_SPECIAL = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+class _ResponseMatcher():
+    """ Matches stdout lines against a list of response regexes (case
+        insensitive). Most lines match nothing, so a single pass over all the
+        patterns rules them out first: a hyperscan database if hyperscan is
+        installed, otherwise one python regex OR'ing every pattern together.
+        Only lines that hit are checked against the individual patterns.
+
+        Lines are expected already lowercased. Patterns are lowercased to
+        match and compiled without re.IGNORECASE, unless lowercasing would
+        change what they mean. Plain strings skip the regex engine and are
+        checked with 'in'
+        """
+
+    def __init__(self, responses):
+        self.responses = list(responses or [])
+
+        # lowercased response if it's a plain string, None if it's a regex.
+        # responses are referred to by their index in these lists
+        self._literals = [None if _REGEX_SPECIAL.search(resp) else resp.lower()
+                          for resp in self.responses]
+
+        # each regex on its own, to tell which responses a line matched.
+        # compiled to match against a lowercased line
+        self._patterns = [self._compile(resp) if literal is None else None
+                          for resp, literal in zip(self.responses, self._literals)]
+
+        # a regex compiled with re.IGNORECASE as a flag can't be OR'd with the
+        # others, its source alone would lose that
+        sources = [pattern.pattern for pattern in self._patterns if pattern is not None]
+        if any(pattern.flags & re.IGNORECASE for pattern in self._patterns if pattern is not None):
+            sources = None
+
+        self._db = self._compile_hyperscan(self.responses)
+
+        self._combined = None
+        if self._db is None:
+            self._combined = self._combine(sources)
+
+    @classmethod
+    def _compile(cls, resp):
+        """ compile resp to match against a lowercased line. falls back to resp
+            as given with re.IGNORECASE if it starts with global flags or the
+            rewritten pattern won't compile
+        """
+        if not _LEADING_FLAGS.match(resp):
+            try:
+                return re.compile(cls._lowercase(resp))
+            except re.error:
+                pass
+
+        return re.compile(resp, re.IGNORECASE)
+
+    @staticmethod
+    def _lowercase(resp):
+        """ return resp lowercased, or if that's not safe, resp wrapped in a
+            case insensitive group
+        """
+        if _CASE_SENSITIVE_SYNTAX.search(resp):
+            return f"(?i:{resp})"
+
+        return resp.lower()
+
+    @staticmethod
+    def _compile_hyperscan(responses):
+        """ compile responses into a block mode hyperscan database. returns None
+            if hyperscan is not installed or does not support a pattern
+            (backreferences, lookarounds, ...)
+        """
+        if hyperscan is None or not responses:
+            return None
+
+        db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        try:
+            db.compile(expressions = [resp.encode("ISO-8859-1") for resp in responses],
+                       ids = list(range(len(responses))),
+                       elements = len(responses),
+                       flags = [hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(responses))
+        except (hyperscan.error, UnicodeEncodeError):
+            return None
+
+        return db
+
+    @staticmethod
+    def _combine(sources):
+        """ compile all pattern sources into a single alternation. returns None
+            if they can't be combined safely, e.g. when a backreference would
+            point at the wrong group once joined.
+        """
+        if not sources:
+            return None
+
+        if any(_BACKREF.search(src) for src in sources):
+            return None
+
+        try:
+            return re.compile("|".join(f"(?:{src})" for src in sources))
+        except re.error:
+            return None
+
+    def matches(self, line, candidates = None):
+        """ return the indices of the responses that match line, limited to
+            candidates (a collection of indices) if given.
+            line - stdout line, already lowercased
+        """
+        if candidates is None:
+            candidates = range(len(self._patterns))
+
+        if self._db is not None:
+            hits = set()
+
+            def on_match(resp_id, start, end, flags, context):
+                hits.add(resp_id)
+
+            self._db.scan(line.encode("ISO-8859-1", "replace"), match_event_handler = on_match)
+            if not hits:
+                return []
+
+            candidates = [i for i in candidates if i in hits]
+
+            return [i for i in candidates if self._match(i, line)]
+
+        # plain strings are checked directly. regexes only get checked on
+        # their own if the combined regex finds something
+        matched = []
+        check_regexes = None
+
+        for i in candidates:
+            literal = self._literals[i]
+            if literal is not None:
+                if literal in line:
+                    matched.append(i)
+                continue
+
+            if check_regexes is None:
+                check_regexes = self._combined is None or bool(self._combined.search(line))
+
+            if check_regexes and self._patterns[i].search(line):
+                matched.append(i)
+
+        return matched
+
+    def _match(self, i, line):
+        """ does response i match line """
+        literal = self._literals[i]
+        if literal is not None:
+            return literal in line
+
+        return bool(self._patterns[i].search(line))
+
 class RunProcess():
     """ Run Process class. Groups functionality around thread management,
         regex processing, etc to make interacting with systems processes easier
@@ -98,203 +285,255 @@ class RunProcess():
         if self.resp_avoid and not isinstance(self.resp_avoid, list):
             self.resp_avoid = [self.resp_avoid]
 
+        ######################################
+        # compile the responses once instead of per stdout line
+        ######################################
+        self._resp_req_matcher = _ResponseMatcher(self.resp_req)
+        self._resp_avoid_matcher = _ResponseMatcher(self.resp_avoid)
+
+        # resp_avoid doesn't change per run, decide once whether to scan for it
+        self._have_resp_avoid = bool(self.resp_avoid)
+
+        # timings in the units start_async() works in
+        self._timeout_ns = self.timeout_ms * 1_000_000
+        self._recovery_s = self.cmd_recovery_time_ms / 1000
+
         ######################################
         # internal working vars
         ######################################
 
-        # create a thread safe value for pass PID of the subprocess back to
-        # the main thread. this is a ctypes value type of 'i' or integer
-        self.__subprocess_pid = multiprocessing.Value('i', 0, lock=True)
-        # thread safe queue for passing stdout back to the main process
-        self.__msg_queue = multiprocessing.Queue()
-
-        # created the process obj but don't start. this is reusable across
-        # multiple run_process start() calls.
-        self.__process = multiprocessing.Process(target = self._run_process,
-                                                 args   = (cmd,
-                                                           self.__msg_queue,
-                                                           self.__subprocess_pid
-                                                          ),
-                                                 daemon = True)
+        # the running 'cmd' process (asyncio.subprocess.Process). None until
+        # start() is called
+        self.__proc = None
 
     def __kill_child_processes(self, parent_pid, sig=signal.SIGTERM):
         """ send the sigterm to the parent_pid and all subprocesses """
+        # any of these may exit while we're looking at them
         try:
             parent = psutil.Process(parent_pid)
+            children = parent.children(recursive=True)
         except psutil.NoSuchProcess:
             return
 
-        children = parent.children(recursive=True)
-
         for process in children:
-            process.send_signal(sig)
+            try:
+                process.send_signal(sig)
+            except psutil.NoSuchProcess:
+                pass
+
+    def __kill_process(self, pid, sig=signal.SIGTERM):
+        """ send the sigterm to pid and everything it spawned. goes through
+            psutil rather than the asyncio process so stop() can be called
+            from any thread
+        """
+        self.__kill_child_processes(pid, sig)
+
+        try:
+            if _NEW_SESSION:
+                # pid leads its own process group
+                os.killpg(pid, sig)
+            else:
+                psutil.Process(pid).send_signal(sig)
+        except (ProcessLookupError, psutil.NoSuchProcess):
+            pass
 
     def stop(self):
         """ stop the running process provided by the 'cmd' var """
-        if self.__process and self.__process.is_alive():
-            self.__kill_child_processes( self.__subprocess_pid.value )
+        if self.is_running():
+            self.__kill_process(self.__proc.pid)
 
     def is_running(self):
         """ is the 'cmd' process running """
-        return self.__process.is_alive()
-
-    def _run_process(self, cmd, msg_queue, pid_value):
-        """ function that acutally runs the process.
-            cmd - cmd to run
-            msg_queue - passes stdout back to the parent process
-            pid_value - multiprocessing value to pass subprocess pid back to the
-                        parent process
+        return self.__proc is not None and self.__proc.returncode is None
+
+    @staticmethod
+    async def _read_lines(stdout):
+        """ async generator over the process' stdout.
+            stdout - asyncio StreamReader for the 'cmd' process
+
+            reads whatever is available, up to _READ_CHUNK, splits it into
+            lines and yields them as a list, so the caller only waits once per
+            read rather than once per line. '\n', '\r\n' and '\r' all end a
+            line, like text mode
         """
+        pending = b""
+
+        while True:
+            chunk = await stdout.read(_READ_CHUNK)
+            if not chunk:
+                break
 
-        p = subprocess.Popen( cmd,
-                              shell=True,
-                              encoding="ISO-8859-1",
-                              stdout=subprocess.PIPE,
-                              stderr=subprocess.STDOUT)
-
-        # update the value of the PID from the subprocess that was generated
-        # this var type needs to be Value() to be managed correctly from a
-        # multiprocessing library perspective
-        pid_value.value = p.pid
-
-        # put anything on stdout into the thread-safe queue
-        # readline will end iter processing when the subprocess completes
-        # there's no way to make this process non blocking so we cant
-        # have this function kill the subprocess in case of timeout. that
-        # will have to be maintained by the top level
-        for stdout_line in iter(p.stdout.readline, ""):
-            if msg_queue:
-                msg_queue.put( stdout_line )
-
-        p.stdout.close()
-        return_code = p.wait()
-        if return_code:
-            raise subprocess.CalledProcessError(return_code, cmd)
+            lines = (pending + chunk).splitlines(keepends=True)
+
+            # hold back a partial line, or a '\r' whose '\n' may be in the
+            # next chunk, until more data arrives
+            pending = b""
+            if not lines[-1].endswith(b"\n"):
+                pending = lines.pop()
+
+            if lines:
+                yield [stdout_line.decode("ISO-8859-1") for stdout_line in lines]
+
+        if pending:
+            yield [pending.decode("ISO-8859-1")]
 
     def start(self):
-        """ start the process that will execute 'cmd' """
+        """ start the process that will execute 'cmd' and wait for the result.
+            blocking wrapper around start_async()
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.start_async())
+
+        # called from code that is already running an event loop, which
+        # asyncio.run() can't nest in. run ours on a worker thread instead
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.start_async()).result()
+
+    async def start_async(self):
+        """ start the process that will execute 'cmd'. waiting for output and
+            the timeout both happen on the event loop, no extra threads or
+            processes
+        """
 
         # don't allow a 2nd start of this object
-        if (self.__process is not None and self.__process.is_alive()):
+        if self.is_running():
             raise Exception("Process already running")
 
         # set success to None until we know we're successful or not
         success = None
-        traces_to_return = ""
+        # lines of stdout to return. joined once at the end rather than
+        # concatenated per line
+        traces_to_return = []
         stop_processing = False
 
         # make a local copy of our class variables we'll edit in this func
         # this will allow us to run a run_process object multiple tiems without
-        # reinstantiation
+        # reinstantiation. required responses still to be found are keyed by
+        # their index in self.resp_req so a match can drop its entry directly
         resp_req = None
         if self.resp_req:
-            resp_req = self.resp_req.copy()
+            resp_req = dict(enumerate(self.resp_req))
 
-        self.__process.start()
+        self.__proc = await asyncio.create_subprocess_shell( self.cmd,
+                                                             stdout=subprocess.PIPE,
+                                                             stderr=subprocess.STDOUT,
+                                                             start_new_session=_NEW_SESSION)
 
-        now = lambda: int(round(time.time() * 1000))
+        stdout_reads = self._read_lines(self.__proc.stdout)
+        # lines already read but not processed yet
+        stdout_lines = collections.deque()
 
-        start_time = now()
+        start_ns = time.monotonic_ns()
 
         try:
 
             while True:
 
                 # check for timeout
-                if (self.timeout_ms != 0 and (now() - start_time > self.timeout_ms)):
+                if (self._timeout_ns != 0 and (time.monotonic_ns() - start_ns > self._timeout_ns)):
                     success = False
                     break
 
-                if self.__msg_queue.empty():
-                    # if the process is dead then we don't need to wait anymore
-                    if not self.__process.is_alive():
+                if not stdout_lines:
+                    # wait for more output, but no longer than the overall timeout
+                    wait_s = None
+                    if self._timeout_ns != 0:
+                        wait_s = max(self._timeout_ns - (time.monotonic_ns() - start_ns), 0) / 1e9
+
+                    try:
+                        stdout_lines.extend(await asyncio.wait_for(stdout_reads.__anext__(),
+                                                                   timeout = wait_s))
+                    except asyncio.TimeoutError:
+                        success = False
                         break
-                    else:
-                        # if we have no data sleep for a bit to not chew up the processor
-                        time.sleep(0.001)
+                    except StopAsyncIteration:
+                        # the process closed stdout, there's nothing left to read
+                        break
+
+                line = stdout_lines.popleft().strip()
+
+                if self.accumulate_traces:
+                    traces_to_return.append(line)
                 else:
-                    line = self.__msg_queue.get_nowait().strip()
-
-                    if self.accumulate_traces:
-                        traces_to_return += line + "\n"
-                    else:
-                        traces_to_return = line + "\n"
-
-                    # print this to stdout
-                    if not self.quiet:
-                        print(line)
-
-                    # look through teh list of required responses. if we dont have
-                    # any then just return
-                    if (resp_req and len(resp_req)):
-
-                        # if we found a required response, remove it from the list
-                        for resp in resp_req:
-                            # if this line matches one from the list then remove it
-                            if re.search(resp, line, re.IGNORECASE):
-                                resp_req.remove(resp)
-
-                                if (self.return_on_first_match):
-                                    success = True
-                                    # no need to look at any more data
-                                    stop_processing = True
-                                    break
-
-                                # if we have no more responses we're looking for, just
-                                # return
-                                if (len(resp_req) == 0 and not self.run_to_completion):
-                                    # sleep some, if we kill the process immediately, sometimes
-                                    # the underlying processes can hang
-                                    if (self.cmd_recovery_time_ms > 0):
-                                        time.sleep( self.cmd_recovery_time_ms / 1000 )
-
-                                    # no need to look at any more data
-                                    stop_processing = True
-
-                                    success = True
-                                    break
-
-                                # get more data so we can keep processing
-                                continue
-
-                    # we found everything we're looking for and are not letting
-                    # the process self terminate
-                    elif not self.run_to_completion:
-                        success = True
+                    traces_to_return = [line]
+
+                # print this to stdout
+                if not self.quiet:
+                    print(line)
+
+                # look through teh list of required responses. if we dont have
+                # any then just return
+                # responses are matched case insensitively. lowercase the line
+                # once here rather than have every pattern fold case per char
+                line_lc = line.lower()
+
+                if resp_req:
+
+                    # if we found required responses, remove them from the list
+                    matched = self._resp_req_matcher.matches(line_lc, resp_req)
+                    for i in matched:
+                        del resp_req[i]
+
+                    if matched:
+                        if (self.return_on_first_match):
+                            success = True
+                            # no need to look at any more data
+                            stop_processing = True
+
+                        # if we have no more responses we're looking for, just
+                        # return
+                        elif (len(resp_req) == 0 and not self.run_to_completion):
+                            # sleep some, if we kill the process immediately, sometimes
+                            # the underlying processes can hang
+                            if (self._recovery_s > 0):
+                                await asyncio.sleep( self._recovery_s )
+
+                            # no need to look at any more data
+                            stop_processing = True
+
+                            success = True
+
+                # we found everything we're looking for and are not letting
+                # the process self terminate
+                elif not self.run_to_completion:
+                    success = True
+                    # no need to look at any more data
+                    stop_processing = True
+                    break
+
+                if self._have_resp_avoid:
+                    if self._resp_avoid_matcher.matches(line_lc):
+                        logger.debug("YIKES: found response to avoid [" + line + "]")
+                        success = False
                         # no need to look at any more data
                         stop_processing = True
-                        break
 
-                    if (self.resp_avoid and len(self.resp_avoid)):
-                        # if we found a required response, remove it from the list
-                        for resp in self.resp_avoid:
-                            # if this line matches one from the list then remove it
-                            if re.search(resp, line, re.IGNORECASE):
-                                logger.debug("YIKES: found response to avoid [" + line + "]")
-                                success = False
-                                # no need to look at any more data
-                                stop_processing = True
-                                break
-
-                    if stop_processing:
-                        break
+                if stop_processing:
+                    break
 
         finally:
 
-            # kill any spawned processes associated with the process
-            if self.__subprocess_pid.value:
-                self.__kill_child_processes(self.__subprocess_pid.value)
+            # kill the process and anything it spawned
+            if self.__proc.returncode is None:
+                self.__kill_process(self.__proc.pid)
 
-            # if the process is still alive then kill it
-            if self.__process.is_alive():
-                #print("joining...:" + str(self.__subprocess_pid.value))
-                self.__process.terminate()
-                self.__process.join()
+            # wait() also waits for stdout to close. if something ignores the
+            # SIGTERM, don't hang on it
+            try:
+                await asyncio.wait_for(self.__proc.wait(), timeout = _KILL_GRACE_S)
+            except asyncio.TimeoutError:
+                self.__kill_process(self.__proc.pid, _SIGKILL)
+                await self.__proc.wait()
 
         if success is None:
             success = False
 
-        return (success, traces_to_return.strip(), resp_req)
+        if resp_req is not None:
+            resp_req = list(resp_req.values())
+
+        return (success, "\n".join(traces_to_return).strip(), resp_req)
 
 ################################################################################
 # CLI PROCESSING FUNCTIONS
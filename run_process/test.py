@@ -0,0 +1,93 @@
+import sys
+
+import run_process
+from run_process import RunProcess, _ResponseMatcher
+
+# ---------------- response matching ----------------
+
+def check_matches(responses, line, expected):
+    """ match line (lowercased, as start_async() does) against responses with
+        and without hyperscan and compare the matched indices to expected
+    """
+    for hs in (run_process.hyperscan, None):
+        saved, run_process.hyperscan = run_process.hyperscan, hs
+        try:
+            matched = _ResponseMatcher(responses).matches(line.lower())
+        finally:
+            run_process.hyperscan = saved
+
+        assert matched == expected, \
+            f"{responses} vs {line!r} (hyperscan={hs is not None}): {matched} != {expected}"
+
+def test_regexes():
+    check_matches([r"ERR\d+", r"[A-Z]+ok"], "err42 HELLOOK", [0, 1])
+    check_matches([r"ERR\d+", r"^done$"], "DONE", [1])
+    check_matches([r"ERR\d+", r"^done$"], "nothing here", [])
+
+def test_candidates():
+    # only the responses still being looked for are reported
+    assert _ResponseMatcher([r"a\d", r"b\d"]).matches("a1 b2", [1]) == [1]
+    assert _ResponseMatcher([r"a\d", r"b\d"]).matches("a1 b2", []) == []
+
+def test_case_sensitive_syntax():
+    # these change meaning if lowercased, they must stay case insensitive as is
+    check_matches([r"\D{3}X", r"\x41B"], "abcx", [0, 1])
+    check_matches([r"(?P<n>ab)(?P=n)"], "ABAB", [0])
+
+def test_character_classes():
+    # ranges that span the upper and lower case letters change if lowercased
+    check_matches([r"x[A-z]y"], "X_Y", [0])
+    check_matches([r"x[Z-a]y"], "X^Y", [0])
+    check_matches([r"[A-Z]+ok", r"v[0-9A-F]+"], "HELLOOK vABC", [0, 1])
+
+def test_literals():
+    check_matches(["Connected", "Hello World"], "CONNECTED to hello world", [0, 1])
+    check_matches(["Connected", r"ERR\d+"], "err7: not connected", [0, 1])
+    check_matches(["Connected", r"ERR\d+"], "nothing here", [])
+
+def test_inline_flags():
+    # global flags must stay at the start of the pattern
+    check_matches(["(?i)error"], "ERROR: bad", [0])
+    check_matches(["(?i)error", "Warn"], "warning", [1])
+    check_matches(["(?m)^Done$", "(?x) fail \\d"], "DONE", [0])
+    check_matches(["(?x) fail \\d"], "FAIL7", [0])
+    check_matches(["(?s)a.b", "(?i:OK)"], "a\nb ok", [0, 1])
+
+# ---------------- end to end ----------------
+
+def test_run_process():
+    success, traces, remaining = RunProcess("echo foo && echo BAR",
+                                            resp_req = ["Foo", r"^b\w+$"],
+                                            quiet = True).start()
+    assert success and remaining == [], (success, traces, remaining)
+
+    success, traces, remaining = RunProcess("echo foo && echo Error 3",
+                                            resp_req = "zzz",
+                                            resp_avoid = [r"ERROR \d"],
+                                            quiet = True).start()
+    assert not success and remaining == ["zzz"], (success, traces, remaining)
+
+def test_run_process_inline_flags():
+    success, traces, remaining = RunProcess("echo foo && echo ERROR",
+                                            resp_req = ["(?i)error", "FOO"],
+                                            quiet = True).start()
+    assert success and remaining == [], (success, traces, remaining)
+
+    success, traces, remaining = RunProcess("echo foo && echo error",
+                                            resp_req = "zzz",
+                                            resp_avoid = ["(?i)ERROR"],
+                                            quiet = True).start()
+    assert not success and remaining == ["zzz"], (success, traces, remaining)
+
+if __name__ == '__main__':
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"PASS {name}")
+            except AssertionError as e:
+                failed += 1
+                print(f"FAIL {name}: {e}")
+
+    sys.exit(1 if failed else 0)
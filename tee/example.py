@@ -15,14 +15,16 @@ logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 logger.setLevel(logging.DEBUG)
 
-# everything printed to stdout after this will go to the log file
-capture_obj = Tee(".")
+# everything printed to stdout inside this block will go to the log file
+with Tee(".") as capture_obj:
 
-print("foo")
-# foo should now be in the logs
+    print("foo")
+    # foo should now be in the logs
 
-# everything printed to stdout after this will go to the new_log file
-capture_obj.log_to_new_file("new_log")
+    # everything printed to stdout after this will go to the new_log file
+    capture_obj.log_to_new_file("new_log")
 
-print("bar")
+    print("bar")
+
+# stdout is restored and the log file closed here
 
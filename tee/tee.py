@@ -37,10 +37,14 @@ import logging
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# a '{pattern}' in the logging structure string
+_PATTERN_SEARCH = re.compile(r"\{([^}]+)\}")
+
 class Tee():
 
-    # precompiled regex to remove ansi escape chars
-    ansi_escape = re.compile(r'(\x9B|\x1B\[)[0-?]*[ -\/]*[@-~]')
+    # everything we drop from a string before it goes to the log file, in
+    # one pass: ansi escape sequences, non-ascii chars and carriage returns
+    log_junk = re.compile(r'(?:\x9B|\x1B\[)[0-?]*[ -\/]*[@-~]|[^\x00-\x7F]|\r')
 
     def __init__(self, logging_dir, logging_name = "log", \
             logging_structure = None):
@@ -66,7 +70,8 @@ class Tee():
             logging_structure = "logs/{date:%Y%m}/{date:%Y%m%d}/{date:%Y%m%dT%H%M%S}"
 
         # within the logging directory, figure out the subdirectory
-        logging_subdirs = self._get_logging_subdir_structure(logging_structure)
+        self._logging_structure_parts = self._parse_logging_structure(logging_structure)
+        logging_subdirs = self._get_logging_subdir_structure()
 
         # store the absolute path of the logging subdir for this test run
         self._logging_dir = os.path.abspath(logging_dir + "/" + logging_subdirs)
@@ -77,66 +82,78 @@ class Tee():
 
         logfile = self._get_path_for_new_file(logging_name)
 
-        self.outfile = open(logfile, "w+")
+        self.outfile = self._open_log(logfile)
 
         self.init_complete = True
 
     def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
 
-        sys.stdout = self.orig_stdout
-        sys.stderr = self.orig_stderr
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-        if not self.outfile.closed:
+    def close(self):
+        """
+            restore stdout/stderr and close the log file, flushing whatever is
+            still buffered. safe to call more than once
+        """
+
+        if sys.stdout is self:
+            sys.stdout = self.orig_stdout
+        if sys.stderr is self:
+            sys.stderr = self.orig_stderr
+
+        if self.outfile and not self.outfile.closed:
             self.outfile.close()
 
-    def _get_logging_subdir_structure(self, logging_structure):
+    def _parse_logging_structure(self, logging_structure):
         """
-            given a pattern string, replace all patterns '{pattern}' with
-            the appropriate value and return the final string
+            split a pattern string into (text, strftime format) pairs, one per
+            '{pattern}' plus a final (text, None) for whatever follows the
+            last one. done once so building the path is just the strftime calls
         """
 
         if (logging_structure is None):
             raise Exception("illegal value for logging structure: " + str(logging_structure))
 
-        currtime = datetime.datetime.now()
-
-        # start off with the string with patterns. we're going to
-        # replace one pattern at a time
-        log_subdir = logging_structure
+        parts = []
+        pos = 0
 
-        # we're going to run this search in a couple places so go ahead and
-        # precompile this pattern
-        pattern_search = re.compile(r"^(.*?)\{([^}]+)\}(.*)$")
+        for logging_struct_match in _PATTERN_SEARCH.finditer(logging_structure):
+            pattern = logging_struct_match.group(1)
 
-        # search the logging struct string for a pattern
-        logging_struct_match = pattern_search.match(log_subdir)
+            if (not pattern.startswith("date:")):
+                raise Exception("unknown logging_structure pattern [" + str(pattern) + "]")
 
-        # keep processing the string until there are no more "{}" patterns defined
-        while(logging_struct_match is not None):
-            #print("matches: " + str(logging_struct_match.groups()))
-            # stuff before the pattern
-            preamble = logging_struct_match.group(1)
-            pattern = logging_struct_match.group(2)
-            # stuff after the pattern
-            tail = logging_struct_match.group(3)
+            # stuff before the pattern and the date format to replace it with
+            parts.append((logging_structure[pos:logging_struct_match.start()], pattern[5:]))
+            pos = logging_struct_match.end()
 
-            pattern_replacement = ""
+        parts.append((logging_structure[pos:], None))
 
-            # replace the pattern with the appropriate value
-            if (pattern.startswith("date:")):
-                pattern_replacement = currtime.strftime(pattern[5:])
-            else:
-                raise Exception("unknown logging_structure pattern [" + str(pattern) + "]")
+        return parts
 
-            # rebuild the string, with the pattern replaced now
-            log_subdir = preamble + pattern_replacement + tail
+    def _get_logging_subdir_structure(self):
+        """
+            replace all patterns '{pattern}' in the parsed logging structure
+            with the appropriate value and return the final string
+        """
 
-            # look for the next pattern
-            logging_struct_match = pattern_search.match(log_subdir)
+        currtime = datetime.datetime.now()
 
+        return "".join(text + (currtime.strftime(date_fmt) if date_fmt else "")
+                       for text, date_fmt in self._logging_structure_parts)
 
-        #print("log_subdir: " + log_subdir)
-        return log_subdir
+    @staticmethod
+    def _open_log(path):
+        # log lines are small and frequent. buffer them in 64k chunks; they go
+        # to disk when the buffer fills, on flush() or when the file is closed.
+        # binary since write() has already reduced everything to ascii, so
+        # there's nothing for a text layer to do
+        return open(path, "wb", buffering=65536)
 
     def _get_path_for_new_file(self, filename):
 
@@ -147,22 +164,20 @@ class Tee():
 
         return os.path.join(self._logging_dir, new_filename)
 
-    def _escape_ansi(self, line):
-        return self.ansi_escape.sub('', line)
-
     def write(self, string):
         # print to stdout
         self.orig_stdout.write(string)
 
         # log the string to file
         if (self.outfile and not self.outfile.closed):
-            # remove all the non-ascii chars
-            string = string.encode("ascii",errors="ignore").decode()
-            # get rid of junk at the beginning, end and Carraige returns in the middle
-            string = string.rstrip().lstrip().replace("\r",'')
-            # get rid of the color info from the string
-            string = self._escape_ansi(string)
-            self.outfile.write(string + "\n")
+            # remove color info, non-ascii chars and carraige returns, then
+            # get rid of junk at the beginning and end. most lines are plain
+            # ascii with none of that in them, so check for it before running
+            # the regex ('\x9B' isn't ascii)
+            if not string.isascii() or '\x1B' in string or '\r' in string:
+                string = self.log_junk.sub('', string)
+            string = string.strip()
+            self.outfile.write(string.encode("ascii") + b"\n")
 
         # if we have completed initialization, we should have an outfile defined
         elif self.init_complete:
@@ -179,9 +194,9 @@ class Tee():
     def log_to_new_file(self, fname, message=None):
         self.outfile.close()
         new_file = self._get_path_for_new_file(fname)
-        self.outfile = open(new_file, "w+")
+        self.outfile = self._open_log(new_file)
 
         if message:
             for line in message:
-                self.outfile.write(line)
+                self.outfile.write(line.encode("utf-8"))
 